@@ -0,0 +1,74 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Configuration of benchmarks.
+
+Run the benchmarks with ``pytest-benchmark``, saving the results into ``.benchmarks``::
+
+    pytest benchmarks --sample-sizes=10000,1000000 --benchmark-autosave
+
+Compare with the previous saved run to catch regressions::
+
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+
+import pytest
+from synthetic import CLASSES
+
+from sample_db_utils.core.classes import ClassCache
+
+
+def pytest_addoption(parser):
+    """Add the options of synthetic data sets."""
+    parser.addoption('--sample-sizes', default='10000',
+                     help='Comma separated number of samples of data sets (Default: 10000)')
+    parser.addoption('--sample-srids', default='4326,32723',
+                     help='Comma separated SRID of data sets (Default: 4326,32723)')
+
+
+def pytest_generate_tests(metafunc):
+    """Parametrize the benchmarks by sample size and SRID."""
+    if 'size' in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption('sample_sizes').split(',')]
+        metafunc.parametrize('size', sizes)
+
+    if 'srid' in metafunc.fixturenames:
+        srids = [int(srid) for srid in metafunc.config.getoption('sample_srids').split(',')]
+        metafunc.parametrize('srid', srids)
+
+
+class MemoryStorager:
+    """Storager which only keeps the number of stored samples."""
+
+    classification_system_id = 1
+
+    def __init__(self, columnar=True):
+        """Init method."""
+        self.columnar = columnar
+        self.total = 0
+
+    def store_data(self, data_sets, dataset_table):
+        """Count the samples."""
+        self.total += len(data_sets)
+
+
+@pytest.fixture
+def storager():
+    """Storager which receives the DataSet."""
+    return MemoryStorager()
+
+
+@pytest.fixture
+def class_cache():
+    """Class cache with a stubbed classification system."""
+    return ClassCache(loader=lambda system_id: range(1, CLASSES + 1))
+
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory):
+    """Folder of the synthetic data sets, shared by benchmarks."""
+    return tmp_path_factory.mktemp('samples')
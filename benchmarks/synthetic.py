@@ -0,0 +1,113 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Synthetic sample data sets used by benchmarks."""
+
+import os
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import numpy
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+
+from sample_db_utils.core.utils import reproject_coordinates
+
+CLASSES = 20
+"""Number of distinct classes of samples. The classes are numbered from 1."""
+
+BOUNDS = (-74.0, -34.0, -34.0, 5.0)
+"""The area of samples (Brazil) in EPSG:4326."""
+
+
+def make_samples(size, geometry='point', srid=4326, seed=0):
+    """Create a data frame of random samples.
+
+    Args:
+        size (int) - Number of samples
+        geometry (str) - Kind of geometry, `point` or `polygon`
+        srid (int) - The SRID of coordinates
+        seed (int) - Seed of random generator
+
+    Returns:
+        geopandas.GeoDataFrame - Samples with class_id, start_date, end_date and geometry
+
+    """
+    random = numpy.random.default_rng(seed)
+
+    x = random.uniform(BOUNDS[0], BOUNDS[2], size)
+    y = random.uniform(BOUNDS[1], BOUNDS[3], size)
+
+    if srid != 4326:
+        x, y = reproject_coordinates(x, y, 4326, srid)
+
+    if geometry == 'point':
+        geometries = shapely.points(x, y)
+    elif geometry == 'polygon':
+        # Squares with side of ~1km (or 0.01 degree)
+        side = 0.01 if srid == 4326 else 1000.0
+        geometries = shapely.box(x, y, x + side, y + side)
+    else:
+        raise ValueError(f'Invalid geometry {geometry}')
+
+    years = random.integers(2015, 2020, size)
+
+    return GeoDataFrame(dict(
+        class_id=random.integers(1, CLASSES + 1, size),
+        start_date=[f'01/09/{year}' for year in years],
+        end_date=[f'{year + 1}-08-31' for year in years],
+    ), geometry=geometries, crs=srid)
+
+
+def write_csv(path, size, srid=4326, seed=0):
+    """Write random point samples as CSV, with `longitude` and `latitude` columns."""
+    samples = make_samples(size, 'point', srid, seed)
+
+    samples['longitude'] = samples.geometry.x
+    samples['latitude'] = samples.geometry.y
+
+    pd.DataFrame(samples.drop(columns='geometry')).to_csv(path, index=False)
+
+    return path
+
+
+def write_json(path, size, srid=4326, seed=0, lines=True):
+    """Write random point samples as JSON, line-delimited by default."""
+    samples = make_samples(size, 'point', srid, seed)
+
+    samples['longitude'] = samples.geometry.x
+    samples['latitude'] = samples.geometry.y
+
+    frame = pd.DataFrame(samples.drop(columns='geometry'))
+
+    if lines:
+        frame.to_json(path, orient='records', lines=True)
+    else:
+        frame.to_json(path, orient='records')
+
+    return path
+
+
+def write_zipped_shapefile(path, size, geometry='point', srid=4326, seed=0):
+    """Write random samples as a zipped shapefile."""
+    samples = make_samples(size, geometry, srid, seed)
+
+    directory = os.path.dirname(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    shapefile = os.path.join(directory, f'{name}.shp')
+
+    samples.to_file(shapefile)
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zip_object:
+        for extension in ('.shp', '.shx', '.dbf', '.prj', '.cpg'):
+            member = os.path.join(directory, f'{name}{extension}')
+
+            if os.path.exists(member):
+                zip_object.write(member, f'{name}{extension}')
+                os.remove(member)
+
+    return path
@@ -0,0 +1,146 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Benchmarks of the driver stages."""
+
+import os
+
+import pandas as pd
+import pytest
+import shapely
+from synthetic import (CLASSES, make_samples, write_csv, write_json,
+                       write_zipped_shapefile)
+
+from sample_db_utils.core.driver import CSV, Shapefile
+
+MAPPINGS = dict(
+    class_id='class_id',
+    longitude='longitude',
+    latitude='latitude',
+    start_date='start_date',
+    end_date='end_date',
+)
+
+
+def _make_driver(driver_class, entries, storager, class_cache, srid=4326, **kwargs):
+    driver = driver_class(entries, dict(MAPPINGS, srid=srid), storager, **kwargs)
+    driver.class_cache = class_cache
+
+    return driver
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'jsonl'])
+def test_csv_load_data_sets(benchmark, data_dir, storager, class_cache, size, srid, file_format):
+    path = str(data_dir / f'samples-{size}-{srid}.{file_format}')
+
+    if not os.path.exists(path):
+        if file_format == 'csv':
+            write_csv(path, size, srid)
+        else:
+            write_json(path, size, srid)
+
+    def load():
+        return _make_driver(CSV, path, storager, class_cache, srid).load_data_sets()
+
+    driver = benchmark(load)
+
+    assert len(driver.get_data_sets()) == size
+
+
+@pytest.mark.parametrize('geometry', ['point', 'polygon'])
+@pytest.mark.parametrize('reader', ['ogr', 'arrow'])
+def test_shapefile_load_data_sets(benchmark, data_dir, storager, class_cache, size, srid, geometry, reader):
+    ogr = pytest.importorskip('osgeo.ogr')
+
+    if reader == 'arrow' and not hasattr(ogr.Layer, 'GetArrowStreamAsNumPy'):
+        pytest.skip('The arrow reader requires GDAL 3.6+')
+
+    path = str(data_dir / f'samples-{geometry}-{size}-{srid}.zip')
+
+    if not os.path.exists(path):
+        write_zipped_shapefile(path, size, geometry, srid)
+
+    def load():
+        return _make_driver(Shapefile, path, storager, class_cache, reader=reader).load_data_sets()
+
+    driver = benchmark(load)
+
+    assert len(driver.get_data_sets()) == size
+
+
+def test_csv_build_data_set(benchmark, storager, class_cache, size, srid):
+    samples = make_samples(size, 'point', srid)
+    csv = pd.DataFrame(dict(longitude=samples.geometry.x, latitude=samples.geometry.y,
+                            class_id=samples['class_id'], start_date=samples['start_date'],
+                            end_date=samples['end_date']))
+
+    driver = _make_driver(CSV, None, storager, class_cache, srid)
+
+    data_set = benchmark(driver.build_data_set, csv)
+
+    assert len(data_set) == size
+
+
+@pytest.mark.parametrize('geometry', ['point', 'polygon'])
+def test_shapefile_build_data_frame(benchmark, storager, class_cache, size, srid, geometry):
+    samples = make_samples(size, geometry, srid)
+    frame = pd.DataFrame(samples.drop(columns='geometry'))
+    geometries = shapely.to_wkb(samples.geometry.to_numpy())
+
+    driver = _make_driver(Shapefile, None, storager, class_cache)
+    driver.crs = srid
+
+    data_set = benchmark(driver.build_data_frame, frame, geometries)
+
+    assert len(data_set) == size
+
+
+def test_validate_classes(benchmark, storager, class_cache, size):
+    classes = make_samples(size)['class_id']
+
+    driver = _make_driver(CSV, None, storager, class_cache)
+
+    def validate():
+        driver.validate_classes(classes.unique())
+
+    benchmark(validate)
+
+    assert driver.class_cache.get(1) == frozenset(range(1, CLASSES + 1))
+
+
+@pytest.mark.parametrize('columnar', [True, False], ids=['data_set', 'dicts'])
+def test_store(benchmark, data_dir, storager, class_cache, size, columnar):
+    path = str(data_dir / f'samples-{size}-4326.csv')
+
+    if not os.path.exists(path):
+        write_csv(path, size)
+
+    storager.columnar = columnar
+
+    driver = _make_driver(CSV, path, storager, class_cache).load_data_sets()
+
+    benchmark(driver.store, 'dataset_table')
+
+    assert storager.total % size == 0
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'pyarrow'])
+def test_csv_read(benchmark, data_dir, storager, class_cache, size, srid, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+
+    path = str(data_dir / f'samples-{size}-{srid}.csv')
+
+    if not os.path.exists(path):
+        write_csv(path, size, srid)
+
+    driver = _make_driver(CSV, path, storager, class_cache, srid, engine=engine, chunk_size=100000)
+
+    def read():
+        return sum(len(frame) for frame in driver.read(path))
+
+    assert benchmark(read) == size
@@ -8,13 +8,40 @@
 
 """Python Sample Database Utils."""
 
-from .core.driver import CSV, Shapefile
-from .drivers.bdc import BDC
-from .drivers.factory_driver import DriversFactory
-from .drivers.hugo import Hugo
-from .drivers.hugo_tese import HugoTese
-from .drivers.inSitu import InSitu
+import importlib
+
 from .version import __version__
 
+# The drivers are imported on first access, since they import GDAL and geopandas
+_lazy_attributes = {
+    'CSV': '.core.driver',
+    'Shapefile': '.core.driver',
+    'GeoPackage': '.core.driver',
+    'FlatGeobuf': '.core.driver',
+    'GeoParquet': '.core.driver',
+    'BDC': '.drivers.bdc',
+    'DriversFactory': '.drivers.factory_driver',
+    'Hugo': '.drivers.hugo',
+    'HugoTese': '.drivers.hugo_tese',
+    'InSitu': '.drivers.inSitu',
+}
+
 __all__ = ('__version__', 'InSitu', 'DriversFactory', 'CSV', 'Shapefile',
-           'BDC', 'Hugo', 'HugoTese',)
+           'GeoPackage', 'FlatGeobuf', 'GeoParquet', 'BDC', 'Hugo', 'HugoTese',)
+
+
+def __getattr__(name):
+    """Import the drivers on first access."""
+    if name not in _lazy_attributes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    """List the module attributes, including the drivers not imported yet."""
+    return sorted(set(globals()) | set(_lazy_attributes))
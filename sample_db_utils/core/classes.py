@@ -0,0 +1,271 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the cache of classes from land use coverage classification systems."""
+
+import asyncio
+import threading
+import time
+from collections.abc import Mapping
+
+import numpy
+import pandas as pd
+
+from sample_db_utils.core.utils import LazyModule, run_in_executor
+
+models = LazyModule('lccs_db.models')
+
+
+def query_classes(system_id):
+    """Query the class identifiers of a classification system.
+
+    Args:
+        system_id (int) - The classification system identifier
+
+    Returns:
+        frozenset of int - The class identifiers
+
+    """
+    LucClass, LucClassificationSystem = models.LucClass, models.LucClassificationSystem
+
+    classes = models.db.session.query(LucClass.id). \
+        join(LucClassificationSystem, LucClass.classification_system_id == LucClassificationSystem.id) \
+        .filter(LucClassificationSystem.id == system_id).all()
+
+    return frozenset(x[0] for x in classes)
+
+
+def query_class_names(system_id):
+    """Query the class identifiers by name of a classification system.
+
+    Args:
+        system_id (int) - The classification system identifier
+
+    Returns:
+        dict - The class identifiers by class name
+
+    """
+    LucClass, LucClassificationSystem = models.LucClass, models.LucClassificationSystem
+
+    classes = models.db.session.query(LucClass.name, LucClass.id). \
+        join(LucClassificationSystem, LucClass.classification_system_id == LucClassificationSystem.id) \
+        .filter(LucClassificationSystem.id == system_id).all()
+
+    return {name: class_id for name, class_id in classes}
+
+
+def lookup_classes(values, classes):
+    """Look up a column of classes, once per distinct value.
+
+    Args:
+        values (array-like) - The classes of samples
+        classes (set|dict) - The class identifiers, or the class identifiers by name
+
+    Returns:
+        tuple (numpy.ndarray, list) - The class identifiers of samples, which are None
+            for the unknown classes, and the distinct unknown classes
+
+    """
+    codes, uniques = pd.factorize(numpy.asarray(values, dtype=object))
+
+    if isinstance(classes, Mapping):
+        found = [classes.get(value) for value in uniques]
+        unknown = [value for value, class_id in zip(uniques, found) if class_id is None]
+    else:
+        found = [value if value in classes else None for value in uniques]
+        unknown = [value for value in uniques if value not in classes]
+
+    # The missing values have code -1, which takes the last item
+    class_ids = numpy.array(found + [None], dtype=object)[codes]
+
+    if (codes == -1).any():
+        unknown.append(None)
+
+    if not unknown:
+        try:
+            class_ids = class_ids.astype(numpy.int64)
+        except (TypeError, ValueError):
+            pass
+
+    return class_ids, unknown
+
+
+class ClassCache:
+    """Process level cache of the classes of each classification system.
+
+    The classes of a classification system are queried once and
+    kept for `ttl` seconds or until `ClassCache.invalidate`. The class
+    names are queried only by the drivers which map `class_name`.
+    """
+
+    def __init__(self, ttl=300, loader=query_classes, names_loader=query_class_names):
+        """Init method.
+
+        Args:
+            ttl (int) - Seconds to keep the classes of a classification system
+            loader (Callable[[int], frozenset]) - Function which retrieves the classes of a classification system
+            names_loader (Callable[[int], dict]) - Function which retrieves the class identifiers by name
+
+        """
+        self.ttl = ttl
+        self.loader = loader
+        self.names_loader = names_loader
+        self._entries = dict()
+        self._lock = threading.Lock()
+        self._pending = dict()
+
+    def _get_cached(self, system_id):
+        with self._lock:
+            entry = self._entries.get(system_id)
+
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+        return None
+
+    def get(self, system_id):
+        """Retrieve the class identifiers of a classification system, querying them when not cached."""
+        classes = self._get_cached(system_id)
+
+        if classes is not None:
+            return classes
+
+        return self.warm(system_id)
+
+    def get_names(self, system_id):
+        """Retrieve the class identifiers by name of a classification system, querying them when not cached."""
+        names = self._get_cached(('names', system_id))
+
+        if names is not None:
+            return names
+
+        return self.warm_names(system_id)
+
+    async def aget(self, system_id, executor=None, names=False):
+        """Retrieve the class identifiers of a classification system without blocking the event loop.
+
+        The query runs in `executor`. Concurrent calls for the same
+        classification system of an event loop wait for a single query.
+        When `names` is set, the class identifiers by name are retrieved (See `ClassCache.get_names`).
+        """
+        classes = self._get_cached(('names', system_id) if names else system_id)
+
+        if classes is not None:
+            return classes
+
+        key = (id(asyncio.get_running_loop()), system_id, names)
+
+        task = self._pending.get(key)
+
+        if task is None:
+            warm = self.warm_names if names else self.warm
+            task = asyncio.ensure_future(run_in_executor(executor, warm, system_id))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+            self._pending[key] = task
+
+        return await asyncio.shield(task)
+
+    def warm(self, system_id):
+        """Query the classes of a classification system and fill the cache."""
+        classes = frozenset(self.loader(system_id))
+
+        with self._lock:
+            self._entries[system_id] = (time.monotonic() + self.ttl, classes)
+
+        return classes
+
+    def warm_names(self, system_id):
+        """Query the class identifiers by name of a classification system and fill the cache."""
+        names = dict(self.names_loader(system_id))
+
+        with self._lock:
+            self._entries[('names', system_id)] = (time.monotonic() + self.ttl, names)
+
+        return names
+
+    def invalidate(self, system_id=None):
+        """Remove the classes of a classification system from cache. When no system is given, clear the cache."""
+        with self._lock:
+            if system_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(system_id, None)
+                self._entries.pop(('names', system_id), None)
+
+    def missing(self, system_id, unique_classes, names=False):
+        """Retrieve the classes which do not exist in classification system.
+
+        Args:
+            system_id (int) - The classification system identifier
+            unique_classes (Iterable) - The classes to check
+            names (bool) - Whether the classes are class names instead of identifiers
+
+        Returns:
+            list - The missing classes
+
+        """
+        classes = self.get_names(system_id) if names else self.get(system_id)
+
+        return [elem for elem in set(unique_classes) if elem not in classes]
+
+    def resolve(self, system_id, values, names=False):
+        """Map a column of classes to the class identifiers of classification system (See `lookup_classes`).
+
+        Args:
+            system_id (int) - The classification system identifier
+            values (array-like) - The classes of samples
+            names (bool) - Whether the classes are class names instead of identifiers
+
+        Returns:
+            tuple (numpy.ndarray, list) - The class identifiers of samples and the unknown classes
+
+        """
+        return lookup_classes(values, self.get_names(system_id) if names else self.get(system_id))
+
+
+class ClassCollector:
+    """Stand-in for `ClassCache` which collects the classes instead of validating them.
+
+    It is used by worker processes, which do not reach the database. The
+    collected classes are validated later by the main process.
+    """
+
+    def __init__(self, names=None):
+        """Init method.
+
+        Args:
+            names (dict) - The class identifiers by name, retrieved by the main process
+
+        """
+        self.classes = set()
+        self.names = names or dict()
+
+    def get(self, system_id):
+        """Retrieve no classes, since the classification system is not reachable."""
+        return frozenset()
+
+    def get_names(self, system_id):
+        """Retrieve the class identifiers by name given by the main process."""
+        return self.names
+
+    def missing(self, system_id, unique_classes, names=False):
+        """Collect the classes and consider all of them valid."""
+        self.classes.update(unique_classes)
+
+        return []
+
+    def resolve(self, system_id, values, names=False):
+        """Collect the classes and map the class names given by the main process, without unknown classes."""
+        class_ids = lookup_classes(values, self.names)[0] if names else numpy.asarray(values)
+
+        self.classes.update(pd.unique(numpy.asarray(values, dtype=object)))
+
+        return class_ids, []
+
+
+class_cache = ClassCache()
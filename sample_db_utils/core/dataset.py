@@ -0,0 +1,117 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the in-memory container of samples loaded by drivers."""
+
+import pandas as pd
+
+from sample_db_utils.core.utils import LazyModule
+
+# Only the row based storagers need geoalchemy2, which imports SQLAlchemy
+elements = LazyModule('geoalchemy2.elements')
+
+
+class DataSet:
+    """Columnar container of loaded samples.
+
+    The samples are kept as a list of chunks. Each chunk is a ``pandas.DataFrame``
+    with the columns which vary per sample and a dict of constant columns,
+    such ``user_id`` or the dates given by the mappings, which are stored once
+    instead of being repeated for every row.
+    """
+
+    def __init__(self):
+        """Init method."""
+        self._chunks = []
+
+    def append(self, frame, **constants):
+        """Append a chunk of samples.
+
+        Args:
+            frame (pandas.DataFrame) - Columns with values per sample
+            **constants - Columns with the same value for every sample of frame
+
+        """
+        if len(frame) == 0:
+            return
+
+        self._chunks.append((frame, constants))
+
+    def extend(self, data_set):
+        """Append all the chunks from another data set."""
+        self._chunks.extend(data_set.chunks())
+
+    def skip(self, rows):
+        """Build a data set without the first `rows` samples, sharing the remaining chunks."""
+        data_set = DataSet()
+
+        for frame, constants in self._chunks:
+            if rows >= len(frame):
+                rows -= len(frame)
+                continue
+
+            data_set.append(frame.iloc[rows:].reset_index(drop=True) if rows else frame, **constants)
+            rows = 0
+
+        return data_set
+
+    def chunks(self):
+        """Retrieve the chunks as tuples of (frame, constants)."""
+        return list(self._chunks)
+
+    def clear(self):
+        """Remove all the loaded samples."""
+        self._chunks = []
+
+    @property
+    def columns(self):
+        """Retrieve the column names of data set."""
+        columns = []
+
+        for frame, constants in self._chunks:
+            for column in list(frame.columns) + list(constants.keys()):
+                if column not in columns:
+                    columns.append(column)
+
+        return columns
+
+    def __len__(self):
+        """Retrieve the number of samples."""
+        return sum(len(frame) for frame, _ in self._chunks)
+
+    def iter_frames(self):
+        """Iterate over the chunks as data frames with the constant columns filled."""
+        for frame, constants in self._chunks:
+            yield pd.DataFrame(frame).assign(**constants)
+
+    def to_frame(self):
+        """Build a single ``pandas.DataFrame`` with all the samples."""
+        if not self._chunks:
+            return pd.DataFrame()
+
+        return pd.concat(self.iter_frames(), ignore_index=True)
+
+    def iter_records(self):
+        """Iterate over the samples as dicts, one per row.
+
+        The `location` EWKB is wrapped into ``geoalchemy2.elements.WKBElement``.
+        """
+        for frame, constants in self._chunks:
+            columns = list(frame.columns)
+
+            for values in frame.itertuples(index=False, name=None):
+                record = dict(zip(columns, values))
+                record.update(constants)
+
+                if isinstance(record.get('location'), bytes):
+                    record['location'] = elements.WKBElement(record['location'], extended=True)
+
+                yield record
+
+    def to_dicts(self):
+        """Build the list of dicts expected by the row based storagers."""
+        return list(self.iter_records())
@@ -0,0 +1,206 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the detection of duplicated samples."""
+
+import os
+from tempfile import TemporaryDirectory
+
+import numpy
+import pandas as pd
+
+from sample_db_utils.core.dataset import DataSet
+
+KEY_COLUMNS = ('location', 'class_id', 'start_date', 'end_date')
+"""The columns which identify a sample."""
+
+
+def hash_samples(frame, constants=None):
+    """Compute a 64 bits hash of the key columns of each sample.
+
+    Args:
+        frame (pandas.DataFrame) - The samples
+        constants (dict) - The columns with the same value for every sample (See `DataSet`)
+
+    Returns:
+        numpy.ndarray - The hashes as ``uint64``
+
+    """
+    constants = constants or dict()
+
+    keys = pd.DataFrame(index=frame.index)
+
+    for column in KEY_COLUMNS:
+        if column in frame.columns:
+            keys[column] = frame[column]
+        else:
+            keys[column] = constants.get(column)
+
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+class Deduplicator:
+    """Detect the samples which were already seen by the driver.
+
+    The samples are identified by the hash of `KEY_COLUMNS`. The hashes are kept
+    as sorted ``uint64`` runs, which take 8 bytes per sample, and runs are
+    merged as they grow. The merges larger than `max_memory_rows` are written
+    block by block into memory-mapped files in `spill_dir`, so the spilled runs
+    are never loaded whole into memory.
+
+    The hashes have 64 bits, so the chance of any two distinct samples being
+    taken as duplicates is about 3 in 10 thousand for 100 million samples.
+    """
+
+    def __init__(self, drop=True, max_memory_rows=None, spill_dir=None):
+        """Init method.
+
+        Args:
+            drop (bool) - Remove the duplicated samples. Otherwise, they are only counted.
+            max_memory_rows (int) - Maximum number of hashes of a merged run kept in memory.
+                Default is None, which keeps all the hashes in memory.
+            spill_dir (str) - The directory of spilled runs. Default is the system temporary directory.
+
+        """
+        self.drop = drop
+        self.max_memory_rows = max_memory_rows
+        self.spill_dir = spill_dir
+        self.duplicates = 0
+        self._runs = []
+        self._temporary_folder = None
+        self._spilled = 0
+
+    def __len__(self):
+        """Retrieve the number of distinct samples seen."""
+        return sum(len(run) for run in self._runs)
+
+    def __enter__(self):
+        """Use the deduplicator as context manager, which removes the spilled runs on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Remove the spilled runs."""
+        self.close()
+
+    def close(self):
+        """Forget the seen samples and remove the spilled runs."""
+        self._runs = []
+
+        if self._temporary_folder is not None:
+            self._temporary_folder.cleanup()
+            self._temporary_folder = None
+
+    def contains(self, hashes):
+        """Check which hashes were already seen.
+
+        Returns:
+            numpy.ndarray - Mask of seen hashes
+
+        """
+        seen = numpy.zeros(len(hashes), dtype=bool)
+
+        for run in self._runs:
+            positions = numpy.searchsorted(run, hashes)
+            found = positions < len(run)
+            found[found] = run[positions[found]] == hashes[found]
+            seen |= found
+
+        return seen
+
+    def add(self, hashes):
+        """Add hashes to the seen samples.
+
+        Returns:
+            numpy.ndarray - Mask of duplicated hashes, seen before or repeated in `hashes`
+
+        """
+        hashes = numpy.asarray(hashes, dtype=numpy.uint64)
+
+        duplicated = pd.Series(hashes).duplicated().to_numpy() | self.contains(hashes)
+
+        self._add_run(numpy.unique(hashes[~duplicated]))
+
+        return duplicated
+
+    def filter(self, data_set):
+        """Detect the duplicated samples of a data set.
+
+        Returns:
+            DataSet - The data set without the duplicated samples, or the same data set when `drop` is not set
+
+        """
+        result = DataSet()
+
+        for frame, constants in data_set.chunks():
+            duplicated = self.add(hash_samples(frame, constants))
+
+            self.duplicates += int(duplicated.sum())
+
+            if self.drop:
+                result.append(frame[~duplicated] if duplicated.any() else frame, **constants)
+
+        return result if self.drop else data_set
+
+    def _add_run(self, run):
+        if len(run) == 0:
+            return
+
+        self._runs.append(run)
+
+        # Merge the runs of similar sizes, so there are about log2(n) runs
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            previous = self._runs.pop()
+
+            self._runs.append(self._merge_runs(previous, last))
+
+            for run in (previous, last):
+                if isinstance(run, numpy.memmap):
+                    os.remove(run.filename)
+
+    def _get_spill_path(self):
+        if self._temporary_folder is None:
+            self._temporary_folder = TemporaryDirectory(dir=self.spill_dir)
+
+        self._spilled += 1
+
+        return os.path.join(self._temporary_folder.name, f'run-{self._spilled}.npy')
+
+    def _merge_runs(self, previous, last):
+        size = len(previous) + len(last)
+
+        if self.max_memory_rows is None or size <= self.max_memory_rows:
+            return numpy.union1d(previous, last)
+
+        path = self._get_spill_path()
+        merged = numpy.lib.format.open_memmap(path, mode='w+', dtype=numpy.uint64, shape=(size,))
+        block = max(self.max_memory_rows // 2, 1)
+        i = j = k = 0
+
+        # Merge the sorted runs block by block, writing straight into the memory-mapped file
+        while i < len(previous) or j < len(last):
+            left = numpy.asarray(previous[i:i + block])
+            right = numpy.asarray(last[j:j + block])
+
+            # Only the hashes up to the smallest block end are known to be in order
+            if len(left) and len(right):
+                bound = min(left[-1], right[-1])
+                left = left[:numpy.searchsorted(left, bound, side='right')]
+                right = right[:numpy.searchsorted(right, bound, side='right')]
+
+            values = numpy.union1d(left, right)
+
+            merged[k:k + len(values)] = values
+
+            i, j, k = i + len(left), j + len(right), k + len(values)
+
+        merged.flush()
+
+        del merged
+
+        # The runs are disjoint, unless the same hashes were added to both
+        return numpy.load(path, mmap_mode='r')[:k]
@@ -8,87 +8,277 @@
 
 """This file contains Brazil Data Cube drivers to list the sample and store in database."""
 
+import asyncio
+import contextvars
+import hashlib
+import io
+import json
 import logging
 import os
+import queue
+import threading
 from abc import ABCMeta, abstractmethod
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
-from datetime import datetime
-from pathlib import Path
+from csv import reader as csv_reader
 from tempfile import TemporaryDirectory
+from uuid import uuid4
+from zipfile import ZipFile, is_zipfile
 
 import pandas as pd
-from geoalchemy2 import shape
-from geopandas import GeoDataFrame, GeoSeries
-from lccs_db.models import LucClass, LucClassificationSystem
-from lccs_db.models import db as _db
-from osgeo import ogr, osr
-from shapely import wkt
-from shapely.geometry import Point
-from shapely.wkt import loads as geom_from_wkt
-from werkzeug.datastructures import FileStorage
+import shapely
+
+from sample_db_utils.core.classes import ClassCollector, class_cache
+from sample_db_utils.core.dataset import DataSet
+from sample_db_utils.core.manifest import LOADING, STORED, hash_file
+from sample_db_utils.core.metrics import Metrics, get_size
+from sample_db_utils.core.utils import (LazyModule, get_date_from_str,
+                                        get_transformer, is_stream,
+                                        parse_dates, reproject,
+                                        reproject_coordinates,
+                                        reproject_shapes, run_in_executor,
+                                        to_ewkb, unzip, validate_mappings,
+                                        wkb_to_ewkb)
+from sample_db_utils.core.validation import (ValidationReport,
+                                             count_out_of_bounds)
+
+# Only the drivers which use them import GDAL and geopandas
+gdal = LazyModule('osgeo.gdal')
+ogr = LazyModule('osgeo.ogr')
+osr = LazyModule('osgeo.osr')
+geopandas = LazyModule('geopandas')
+pa = LazyModule('pyarrow')
+pacsv = LazyModule('pyarrow.csv')
+pq = LazyModule('pyarrow.parquet')
+pyproj = LazyModule('pyproj')
+
+
+def _load_file(driver_class, state, file):
+    """Load a whole file in a worker process.
+
+    The worker does not reach the database, so the classes of file
+    are collected to be validated by the main process.
+
+    Args:
+        driver_class (type) - The driver class
+        state (dict) - The driver state built by `Driver.get_worker_state`
+        file (str) - The file path
+
+    Returns:
+        tuple (DataSet, set) - The samples and the classes of file
 
-from sample_db_utils.core.utils import (get_date_from_str, is_stream,
-                                        reproject, unzip, validate_mappings)
+    """
+    driver = driver_class.__new__(driver_class)
+    driver.__dict__.update(state)
+
+    data_sets = DataSet()
+
+    for data_set in driver.load_chunks(file):
+        data_sets.extend(data_set)
+
+    return data_sets, driver.class_cache.classes
 
 
-def get_date_from_str(date, date_ref=None):
-    """Build date from str."""
-    date = date.replace('/', '-')
+_DONE = object()
 
-    try:
-        date = datetime.strptime(date, '%d-%m-%Y').strftime('%Y-%m-%d')
-    except:
-        return date
 
-    return date
+def _put(bounded_queue, item, stop):
+    """Put an item into a bounded queue, waiting for room until `stop` is set.
+
+    Returns:
+        bool - Whether the item was put
+
+    """
+    while not stop.is_set():
+        try:
+            bounded_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+
+    return False
 
 
 class Driver(metaclass=ABCMeta):
     """Generic interface for data reader."""
 
-    def __init__(self, storager, user=None, system=None):
+    class_cache = class_cache
+    """The cache of classes used to validate samples."""
+
+    def __init__(self, storager, user=None, system=None, chunk_size=None, workers=None, metrics=None,
+                 manifest=None, dedupe=None):
         """Init method.
 
         Args:
             storager (Storager) - Storager Strategy from sample-db-utils
             user (sample_db.models.User) - The user instance sample owner
             system (lccs_db.models.LucClassificationSystem) - The land use coverage classification system
+            chunk_size (int) - Maximum number of samples read at once. Default is None, which reads the whole file.
+            workers (int) - Number of processes used to load files in parallel. Default is None, which loads
+                the files one after another.
+            metrics (Metrics) - The instrumentation of pipeline stages. Default is None, which reports nothing.
+            manifest (Manifest) - The checkpoint of stored files. The files already stored and unchanged
+                are skipped, as the samples already stored of an unchanged file partially stored.
+                Default is None, which loads every file.
+            dedupe (Deduplicator) - The detection of duplicated samples, which are dropped or counted
+                before being stored. It is closed once the samples are stored, which removes its
+                spilled runs. Default is None, which stores every sample.
 
         """
         self.storager = storager
         self.user = user
         self.system = system
-        self._data_sets = []
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.metrics = metrics or Metrics()
+        self.manifest = manifest
+        self.dedupe = dedupe
+        self._data_sets = DataSet()
+        self._fingerprints = dict()
+        self._stored_rows = dict()
+        self._loaded_files = []
+
+    def get_worker_state(self):
+        """Retrieve the state sent to worker processes (See `Driver.workers`).
+
+        The storager and database objects are not sent. The worker
+        collects the classes with `ClassCollector` instead of validating them
+        and does not report metrics, which are measured by the main process.
+        """
+        state = self.__dict__.copy()
+        state.update(
+            storager=None,
+            system=None,
+            entries=None,
+            class_cache=ClassCollector(names=self._get_class_names()),
+            metrics=Metrics(),
+            manifest=None,
+            dedupe=None,
+            _data_sets=DataSet(),
+            _system_id=self.get_classification_system_id()
+        )
+
+        return state
 
     @abstractmethod
     def load(self, file):
         """Open the file and load data."""
 
+    def load_chunks(self, file):
+        """Open the file and yield the samples as `DataSet` chunks.
+
+        The default implementation loads the whole file
+        with `Driver.load` as a single chunk.
+        """
+        data_sets, self._data_sets = self._data_sets, DataSet()
+
+        try:
+            self.load(file)
+            chunk = self._data_sets
+        finally:
+            self._data_sets = data_sets
+
+        yield chunk
+
+    def read_chunks(self, file):
+        """Open the file and yield its chunks as read, before `Driver.transform_chunk`.
+
+        The default implementation yields the chunks built by `Driver.load_chunks`.
+        """
+        yield from self.load_chunks(file)
+
+    def transform_chunk(self, file, chunk):
+        """Validate and build a chunk yielded by `Driver.read_chunks` into a `DataSet`."""
+        return chunk
+
+    def _transform(self, file, chunk):
+        # Chunks loaded by worker processes are already built
+        if isinstance(chunk, DataSet):
+            return chunk
+
+        return self.transform_chunk(file, chunk)
+
     @abstractmethod
     def load_classes(self, file):
         """Load sample classes in memory."""
 
-    def validate_classes(self, unique_classes):
-        """Validate if classes exist in classification system."""
+    def get_classification_system_id(self):
+        """Retrieve the classification system identifier of samples or None when not set."""
         if self.system:
-            system_id = self.system.id
-        elif self.storager.classification_system_id is not None:
-            system_id = self.storager.classification_system_id
-        else:
-            raise RuntimeError("Missing Classification System ")
+            return self.system.id
+
+        if self.storager is None:
+            # Worker processes (See `Driver.get_worker_state`)
+            return getattr(self, '_system_id', None)
+
+        return getattr(self.storager, 'classification_system_id', None)
+
+    def validate_classes(self, unique_classes):
+        """Validate if classes exist in classification system (See `Driver.resolve_classes`)."""
+        self.resolve_classes(list(unique_classes))
+
+    def resolve_classes(self, values):
+        """Map a column of classes to the class identifiers of classification system.
+
+        The classes are class names when `class_name` is mapped, otherwise class identifiers.
+        The classes of classification system are retrieved from `Driver.class_cache`
+        and each distinct class is looked up once.
 
-        classes = _db.session.query(LucClass.id). \
-            join(LucClassificationSystem, LucClass.classification_system_id == LucClassificationSystem.id) \
-            .filter(LucClassificationSystem.id == system_id).all()
+        Args:
+            values (array-like) - The classes of samples
+
+        Returns:
+            numpy.ndarray - The class identifiers of samples
+
+        Raises:
+            RuntimeError - When any class does not exist in the classification system, listing all of them
 
-        classes_lists = [x[0] for x in classes]
+        """
+        system_id = self.get_classification_system_id()
+
+        if system_id is None:
+            raise RuntimeError("Missing Classification System ")
 
-        not_exist = list(set(unique_classes) - set(classes_lists) & set(unique_classes))
+        class_ids, not_exist = self.class_cache.resolve(system_id, values, names=self.has_class_names())
 
         if len(not_exist) > 0:
             raise RuntimeError(f"The classes: {', '.join([str(elem) for elem in not_exist])} "
                                f"does not exist in the classification system!")
 
+        return class_ids
+
+    def has_class_names(self):
+        """Whether the samples have class names (`class_name` mapping) instead of class identifiers."""
+        return bool((getattr(self, 'mappings', None) or dict()).get('class_name'))
+
+    def get_class_column(self):
+        """Retrieve the source column of classes, which holds class names when `class_name` is mapped."""
+        mappings = getattr(self, 'mappings', None) or dict()
+
+        return mappings.get('class_name') or mappings.get('class_id')
+
+    def _get_class_names(self):
+        # The class identifiers by name sent to worker processes
+        system_id = self.get_classification_system_id()
+
+        if system_id is None or not self.has_class_names():
+            return None
+
+        return self.class_cache.get_names(system_id)
+
+    def warm_classes(self):
+        """Fill the class cache once for all the files to be loaded."""
+        system_id = self.get_classification_system_id()
+
+        if system_id is None:
+            return
+
+        if self.has_class_names():
+            self.class_cache.get_names(system_id)
+        else:
+            self.class_cache.get(system_id)
+
     @abstractmethod
     def get_files(self):
         """Retrieve list of files to load."""
@@ -97,287 +287,1651 @@ class Driver(metaclass=ABCMeta):
         """Retrieve the loaded data sets.
 
         Returns:
-            list of dict - Loaded data sets
+            DataSet - Loaded data sets. Use `DataSet.to_dicts` to get a list of dict.
 
         """
         return self._data_sets
 
+    def get_constants(self):
+        """Retrieve the columns which have the same value for every sample.
+
+        The constant columns are the sample owner and the dates
+        provided as `value` in mappings. They are stored once per
+        data set chunk instead of once per sample.
+        """
+        constants = dict(user_id=self.user)
+
+        mappings = getattr(self, 'mappings', None) or dict()
+
+        for field in ('start_date', 'end_date', 'collection_date'):
+            value = (mappings.get(field) or dict()).get('value')
+
+            if value:
+                constants[field] = get_date_from_str(value, errors='ignore')
+
+        return constants
+
+    def get_mapped_columns(self):
+        """Retrieve the source columns used by the mappings, which are the only ones to read."""
+        mappings = getattr(self, 'mappings', None) or dict()
+        columns = []
+
+        for field in ('geom', 'longitude', 'latitude'):
+            if isinstance(mappings.get(field), str):
+                columns.append(mappings[field])
+
+        if isinstance(self.get_class_column(), str):
+            columns.append(self.get_class_column())
+
+        for field in ('start_date', 'end_date', 'collection_date'):
+            mapping = mappings.get(field) or dict()
+
+            if not mapping.get('value') and mapping.get('key'):
+                columns.append(mapping['key'])
+
+        return list(dict.fromkeys(columns))
+
+    def validate(self, max_errors=100):
+        """Check the files without loading them, as a dry run of `Driver.load_and_store`.
+
+        The files are read once, in chunks, to check the mapped columns,
+        the classes, the dates and the coordinates. The geometries are not
+        built and the samples are not kept in memory.
+
+        Args:
+            max_errors (int) - Maximum number of error messages kept in report
+
+        Returns:
+            ValidationReport - The summary of checks
+
+        """
+        report = ValidationReport(max_errors=max_errors)
+
+        system_id = self.get_classification_system_id()
+
+        if system_id is None:
+            report.add_error(None, 'Missing Classification System')
+            return report
+
+        # The classes are collected while reading and validated at once
+        collector = ClassCollector()
+        own_cache = 'class_cache' in self.__dict__
+        class_cache, self.class_cache = self.class_cache, collector
+
+        try:
+            for f in self.get_files():
+                report.files += 1
+
+                try:
+                    self.check_file(f, report)
+                except Exception as e:
+                    report.add_error(f, str(e))
+        finally:
+            if own_cache:
+                self.class_cache = class_cache
+            else:
+                del self.class_cache
+
+        report.classes.update(collector.classes)
+        report.missing_classes = sorted(class_cache.missing(system_id, report.classes, names=self.has_class_names()),
+                                        key=str)
+
+        return report
+
+    def check_file(self, file, report):
+        """Check the chunks of a file read by `Driver.read_chunks`."""
+        for chunk in self.read_chunks(file):
+            self.check_chunk(file, chunk, report)
+
+    def check_chunk(self, file, chunk, report):
+        """Check a chunk read by `Driver.read_chunks`.
+
+        The default implementation only counts the samples of chunks already built as `DataSet`.
+        """
+        report.rows += len(chunk)
+
+    def check_frame(self, file, frame, report, columns=None):
+        """Check the mapped columns, the classes and the dates of a data frame.
+
+        Args:
+            file (str) - The file of data frame
+            frame (pandas.DataFrame) - The samples
+            report (ValidationReport) - The report which is updated
+            columns (list) - The columns expected in frame. Default is `Driver.get_mapped_columns`.
+
+        """
+        report.rows += len(frame)
+
+        optional = (self.mappings.get('collection_date') or dict()).get('key')
+
+        for column in (self.get_mapped_columns() if columns is None else columns):
+            if column not in frame.columns and column != optional:
+                report.add_error(file, f'Missing column {column}')
+
+        class_column = self.get_class_column()
+
+        if isinstance(class_column, str) and class_column in frame.columns:
+            report.classes.update(frame[class_column].dropna().unique().tolist())
+
+        for field in ('start_date', 'end_date', 'collection_date'):
+            mapping = self.mappings.get(field) or dict()
+            key = mapping.get('key')
+
+            if mapping.get('value') or key not in frame.columns:
+                continue
+
+            values = frame[key]
+            invalid = values.notna() & parse_dates(values, errors='coerce').isna()
+
+            if invalid.any():
+                report.invalid_dates[field] += int(invalid.sum())
+                report.add_error(file, f'Invalid {field}: {", ".join(map(str, values[invalid].unique()[:10]))}')
+
     def load_data_sets(self):
         """Load data sets in memory using database format."""
-        files = self.get_files()
+        self.warm_classes()
+
+        files = self._get_files()
+
+        if self._use_workers(files):
+            for f, data_set in self._load_files_parallel(files):
+                self._data_sets.extend(self._skip_stored_rows(f, data_set))
+                self._loaded_files.append((f, len(data_set)))
+                logging.info('{} loaded in memory'.format(f))
+
+            return self
 
         for f in files:
-            self.load(f)
-            print("{} loaded in memory".format(f))
+            data_sets, self._data_sets = self._data_sets, DataSet()
+
+            try:
+                with self.metrics.stage('load', f) as metrics:
+                    self.load(f)
+
+                    metrics.rows = len(self._data_sets)
+                    metrics.bytes_read = get_size(f)
+            finally:
+                data_sets.extend(self._skip_stored_rows(f, self._data_sets))
+                self._data_sets = data_sets
+
+            self._loaded_files.append((f, metrics.rows))
+            logging.info('{} loaded in memory'.format(f))
 
         return self
 
-    def store(self, dataset_table):
-        """Store the data into database using Storager strategy."""
-        self.storager.store_data(self._data_sets, dataset_table)
+    def iter_data_sets(self):
+        """Iterate over the data sets of all files in chunks of at most `chunk_size` samples.
 
+        Each chunk is validated and built only when requested, so
+        the memory used does not depend on the size of files.
+        """
+        for _, data_set in self._iter_file_data_sets():
+            yield data_set
 
-class CSV(Driver):
-    """Defines a Base class for handle CSV data files.
+    def _iter_file_data_sets(self):
+        for f, chunk in self.iter_chunks():
+            yield f, self._transform(f, chunk)
 
-    Basically, a CSV is built with a mappings config.
-    The config describes how to read the dataset in order to
-    create a Brazil Data Cube sample. The `mappings`
-    must include at least the required fields to fill
-    a sample, such latitude, longitude and class_id fields.
-    """
+    def iter_chunks(self):
+        """Iterate over the chunks of all files as read, yielding tuples of (file, chunk).
 
-    def __init__(self, entries, mappings, storager=None, **kwargs):
-        """Init method.
+        The chunks loaded by worker processes are yielded already built as `DataSet`.
+        """
+        self.warm_classes()
 
-        Args:
-            entries (string|io.IOBase) - The file entries
-            mappings (dict) - CSV Mappings to Sample
-            storager (PostgisAccessor) - The PostgisAccessor from utils
+        files = self._get_files()
+
+        if self._use_workers(files):
+            yield from self._load_files_parallel(files)
+
+            return
+
+        for f in files:
+            for chunk in self.read_chunks(f):
+                yield f, chunk
+
+    def _get_files(self):
+        with self.metrics.stage('get_files') as metrics:
+            files = self.get_files()
+
+            # Uploaded streams do not have a path to be tracked
+            if self.manifest is not None and not is_stream(getattr(self, 'entries', None)):
+                files = self._skip_stored(files)
+
+            metrics.rows = len(files)
+
+        return files
+
+    def get_fingerprint(self, file):
+        """Retrieve the content hash of a file, used by `Driver.manifest` to detect changed files."""
+        return hash_file(file)
+
+    def _skip_stored(self, files):
+        """Remove the files already stored and unchanged according to `Driver.manifest`."""
+        pending = []
+
+        for f in files:
+            fingerprint = self.get_fingerprint(f)
+
+            if self.manifest.is_stored(f, fingerprint):
+                logging.info('Skipping {}, which is already stored'.format(f))
+                continue
+
+            record = self.manifest.get(f)
+
+            if record is not None and record[1] == LOADING:
+                if record[0] == fingerprint:
+                    logging.info('Resuming {} after the {} samples stored by a previous run'.format(f, record[2]))
+                    self._stored_rows[f] = record[2] or 0
+                else:
+                    logging.warning('{} was partially stored by a previous run and changed since'.format(f))
 
+            self._fingerprints[f] = fingerprint
+            pending.append(f)
+
+        return pending
+
+    def _skip_stored_rows(self, file, data_set):
+        """Remove the first samples of a file which were stored by a previous run (See `Driver._skip_stored`).
+
+        The files are read in the same order, so the samples stored before
+        the last checkpoint of a file are the first ones of the next run.
         """
-        copy_mappings = deepcopy(mappings)
+        rows = self._stored_rows.get(file)
 
-        validate_mappings(copy_mappings)
+        if not rows:
+            return data_set
 
-        super(CSV, self).__init__(storager, **kwargs)
+        self._stored_rows[file] = max(rows - len(data_set), 0)
 
-        self.mappings = copy_mappings
-        self.entries = entries
+        return data_set.skip(rows)
 
-    def get_files(self):
-        """Get files."""
-        if is_stream(self.entries) or \
-                os.path.isfile(self.entries):
-            return [self.entries]
+    def _checkpoint(self, file, status, rows):
+        """Record the status of a file in `Driver.manifest`."""
+        fingerprint = self._fingerprints.get(file)
 
-        files = os.listdir(self.entries)
+        if self.manifest is None or fingerprint is None:
+            return
 
-        return [
-            os.path.join(self.entries, f) for f in files if f.endswith(".csv")
-        ]
+        self.manifest.mark(file, fingerprint, status, rows=rows)
 
-    def build_data_set(self, csv):
-        """Build dataset sample data.
+        # Inside a storager transaction, the records are committed with it (See `Manifest`)
+        if not getattr(self.storager, 'in_transaction', False):
+            self.manifest.commit()
 
-        Args:
-            csv(pd.DataFrame) - Open CSV file
+    def _use_workers(self, files):
+        # Streams can not be sent to worker processes
+        return bool(self.workers) and len(files) > 1 and not any(is_stream(f) for f in files)
 
-        Returns:
-            GeoDataFrame CSV with geospatial location
+    def _load_files_parallel(self, files):
+        """Load the files using a process pool, yielding (file, DataSet) in the order of files.
 
+        At most two files per worker are loaded ahead of the consumer.
         """
-        if 'longitude' in self.mappings and 'latitude' in self.mappings:
-            geom_column = [
-                Point(xy) for xy in zip(csv[self.mappings['longitude']], csv[self.mappings['longitude']])
-            ]
-            geocsv = GeoDataFrame(csv,
-                                  crs=self.mappings.get('srid', 4326),
-                                  geometry=geom_column)
-            geocsv['location'] = geocsv['geometry'].apply(
-                lambda point: ';'.join(['SRID=4326', point.wkt])
-            )
-            if 'latitude' in geocsv:
-                del geocsv['latitude']
-            if 'longitude' in geocsv:
-                del geocsv['longitude']
+        state = self.get_worker_state()
 
-        else:
-            geom_column = GeoSeries.from_wkt(csv[self.mappings['geom']],
-                                             crs=self.mappings.get('srid', 4326))
-            geocsv = GeoDataFrame(csv, crs=self.mappings.get('srid', 4326), geometry=geom_column)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            files = iter(files)
 
-        geocsv['class_id'] = geocsv[self.mappings['class_id']]
+            for f in files:
+                pending.append((f, executor.submit(_load_file, type(self), state, f)))
 
-        start_date = self.mappings['start_date'].get('value') or \
-                     geocsv[self.mappings['start_date']['key']]
+                if len(pending) >= self.workers * 2:
+                    break
 
-        end_date = self.mappings['end_date'].get('value') or \
-                   geocsv[self.mappings['end_date']['key']]
+            while pending:
+                f, future = pending.popleft()
 
-        collection_date = self.mappings['collection_date'].get('value') or \
-                          geocsv[self.mappings['collection_date']['key']] or \
-                          None
+                # The time waiting for the worker, since it does not report metrics
+                with self.metrics.stage('load', f) as metrics:
+                    try:
+                        data_set, unique_classes = future.result()
+                    except Exception as e:
+                        self._cancel(pending)
 
-        if collection_date:
-            collection_date = get_date_from_str(collection_date)
+                        raise RuntimeError(f'Could not load {f}: {e}') from e
 
-        geocsv['user_id'] = self.user
-        geocsv['start_date'] = start_date
-        geocsv['end_date'] = end_date
-        geocsv['collection_date'] = collection_date
+                    metrics.rows = len(data_set)
+                    metrics.bytes_read = get_size(f)
 
-        # Delete id column to avoid DuplicateError on database
-        if 'id' in geocsv.columns:
-            del geocsv['id']
+                with self.metrics.stage('validate_classes', f) as metrics:
+                    try:
+                        self.validate_classes(unique_classes)
+                    except Exception as e:
+                        self._cancel(pending)
 
-        if 'geometry' in geocsv.columns:
-            del geocsv['geometry']
+                        raise RuntimeError(f'Could not load {f}: {e}') from e
 
-        return geocsv
+                    metrics.rows = len(unique_classes)
 
-    def get_unique_classes(self, csv):
-        """Retrieve distinct sample classes from CSV datasource."""
-        return csv[self.mappings['class_id']].unique()
+                next_file = next(files, None)
 
-    def load(self, file):
-        """Load file."""
-        if file.mimetype == 'application/json':
-            csv = pd.read_json(file)
+                if next_file is not None:
+                    pending.append((next_file, executor.submit(_load_file, type(self), state, next_file)))
+
+                yield f, data_set
+
+    @staticmethod
+    def _cancel(pending):
+        """Cancel the files queued in the process pool, so it does not wait for them to load."""
+        for _, future in pending:
+            future.cancel()
+
+    def load_and_store(self, dataset_table, pipeline=False, queue_size=2):
+        """Load and store the data sets chunk by chunk.
+
+        Each chunk is validated, built and stored using Storager
+        strategy before reading the next one. The chunks are not kept
+        in `Driver.get_data_sets`.
+
+        With `pipeline`, the chunks are read and built by two background
+        threads while the current thread stores the previous ones. The stages
+        are linked by queues of at most `queue_size` chunks, so a slow stage
+        blocks the previous one instead of accumulating chunks in memory.
+
+        With `Driver.manifest`, each file is recorded as stored once all its
+        chunks are stored.
+
+        Args:
+            dataset_table (sqlalchemy.Table) - The dataset table
+            pipeline (bool) - Run the read, transform and store stages at the same time
+            queue_size (int) - Maximum number of chunks waiting between two stages
+
+        """
+        if pipeline:
+            data_sets = self._iter_pipeline(queue_size)
         else:
-            csv = pd.read_csv(file)
+            data_sets = self._iter_file_data_sets()
 
-        self.load_classes(csv)
+        current, rows = None, 0
 
-        res = self.build_data_set(csv)
+        try:
+            for f, data_set in data_sets:
+                if f != current:
+                    self._checkpoint(current, STORED, rows)
+                    current, rows = f, 0
 
-        self._data_sets.extend(res.T.to_dict().values())
+                size = len(data_set)
+                data_set = self._skip_stored_rows(f, data_set)
 
-    def load_classes(self, file):
-        """Load classes of a file."""
-        unique_classes = self.get_unique_classes(file)
+                if len(data_set):
+                    self._store_data_set(data_set, dataset_table)
 
-        self.validate_classes(unique_classes)
+                rows += size
+                self._checkpoint(current, LOADING, rows)
 
-        return
+            self._checkpoint(current, STORED, rows)
+        finally:
+            self._close_dedupe()
 
+        return self
 
-class Shapefile(Driver):
-    """Base class for Shapefiles Reader."""
+    async def aload_and_store(self, dataset_table, executor=None):
+        """Load and store the data sets chunk by chunk without blocking the event loop.
 
-    def __init__(self, entries, mappings, storager=None, **kwargs):
-        """Init method."""
-        copy_mappings = deepcopy(mappings)
+        It is the asynchronous version of `Driver.load_and_store`, for web handlers.
+        The chunks are read and built in `executor` while the previous one is stored.
+        The classes are retrieved with `ClassCache.aget` and storagers which define
+        the coroutine ``astore_data`` are awaited. Other storagers run in `executor`.
 
-        validate_mappings(copy_mappings)
+        Args:
+            dataset_table (sqlalchemy.Table) - The dataset table
+            executor (concurrent.futures.Executor) - The executor of blocking work.
+                Default is None, which uses the default executor of event loop.
 
-        super(Shapefile, self).__init__(storager, **kwargs)
+        """
+        system_id = self.get_classification_system_id()
+        aget = getattr(self.class_cache, 'aget', None)
 
-        self.mappings = copy_mappings
-        self.entries = entries
-        self.temporary_folder = TemporaryDirectory()
-        self.class_id = None
-        self.start_date = None
-        self.end_date = None
-        self.collection_date = None
-        self.crs = None
+        if system_id is not None and aget is not None:
+            await aget(system_id, executor=executor, names=self.has_class_names())
 
-    def get_unique_classes(self, ogr_file, layer_name):
-        """Retrieve distinct sample classes from shapefile datasource."""
-        classes = self.mappings.get('class_id')
+        data_sets = self._iter_file_data_sets()
 
-        if isinstance(classes, str):
-            classes = self.mappings['class_id']
+        pending = asyncio.ensure_future(run_in_executor(executor, next, data_sets, _DONE))
 
-        else:
-            return classes['value']
+        current, rows = None, 0
 
-        layer = ogr_file.GetLayer(layer_name)
+        try:
+            while True:
+                item = await pending
 
-        if layer.GetFeatureCount() == 0:
-            return []
+                if item is _DONE:
+                    break
 
-        unique_c = ogr_file.ExecuteSQL(f'SELECT DISTINCT {classes} FROM {layer_name}')
+                # Read the next chunk while the current one is stored
+                pending = asyncio.ensure_future(run_in_executor(executor, next, data_sets, _DONE))
 
-        result = []
-        for i, feature in enumerate(unique_c):
-            result.append(feature.GetField(0))
+                f, data_set = item
 
-        return result
+                if f != current:
+                    self._checkpoint(current, STORED, rows)
+                    current, rows = f, 0
 
-    def get_files(self):
-        """Get files."""
-        if isinstance(self.entries, FileStorage) or \
-                self.entries.endswith('.zip'):
-            unzip(self.entries, self.temporary_folder.name)
+                size = len(data_set)
+                data_set = self._skip_stored_rows(f, data_set)
 
-            self.entries = self.temporary_folder.name
+                if len(data_set):
+                    await self._astore_data_set(data_set, dataset_table, executor)
 
-        if is_stream(self.entries) or \
-                (os.path.isfile(self.entries) and self.entries.endswith('.shp')):
-            return [self.entries]
+                rows += size
+                self._checkpoint(current, LOADING, rows)
 
-        files = os.listdir(self.entries)
+            self._checkpoint(current, STORED, rows)
+        finally:
+            # The generator can not be closed while it runs
+            await asyncio.gather(pending, return_exceptions=True)
 
-        return [
-            os.path.join(self.entries, f) for f in files if f.endswith('.shp')
+            await run_in_executor(executor, data_sets.close)
+
+            self._close_dedupe()
+
+        return self
+
+    async def _astore_data_set(self, data_set, dataset_table, executor):
+        astore_data = getattr(self.storager, 'astore_data', None)
+
+        if astore_data is None:
+            await run_in_executor(executor, self._store_data_set, data_set, dataset_table)
+            return
+
+        data_set = await run_in_executor(executor, self._deduplicate, data_set)
+
+        with self.metrics.stage('store') as metrics:
+            if not getattr(self.storager, 'columnar', False):
+                data_set = await run_in_executor(executor, data_set.to_dicts)
+
+            await astore_data(data_set, dataset_table, executor=executor)
+
+            metrics.rows = len(data_set)
+
+    def _iter_pipeline(self, queue_size):
+        """Iterate over the tuples of (file, DataSet) built by the read and transform threads."""
+        read_queue = queue.Queue(maxsize=queue_size)
+        transform_queue = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+
+        def read():
+            chunks = self.iter_chunks()
+
+            try:
+                for item in chunks:
+                    if not _put(read_queue, (None, item), stop):
+                        return
+            except BaseException as e:
+                _put(read_queue, (e, None), stop)
+                return
+            finally:
+                chunks.close()
+
+            _put(read_queue, (None, _DONE), stop)
+
+        def transform():
+            while not stop.is_set():
+                try:
+                    error, item = read_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                if error is None and item is not _DONE:
+                    try:
+                        item = item[0], self._transform(*item)
+                    except BaseException as e:
+                        error = e
+
+                if not _put(transform_queue, (error, item), stop) or error is not None or item is _DONE:
+                    return
+
+        # The classes are queried in the calling thread, which may hold the database context
+        self.warm_classes()
+
+        # Each thread runs with a copy of current context, as `run_in_executor`
+        threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(read,),
+                             name='sample-db-utils-read', daemon=True),
+            threading.Thread(target=contextvars.copy_context().run, args=(transform,),
+                             name='sample-db-utils-transform', daemon=True),
         ]
 
-    def build_data_set(self, feature, **kwargs):
-        """Build dataset sample data."""
-        geometry = feature.GetGeometryRef()
+        for thread in threads:
+            thread.start()
 
-        srs = geometry.GetSpatialReference()
+        try:
+            while True:
+                error, item = transform_queue.get()
 
-        reproject(geometry, self.crs, target_srid=4326)
+                if error is not None:
+                    raise error
 
-        geom_shapely = geom_from_wkt(
-            geometry.ExportToWkt())
+                if item is _DONE:
+                    return
 
-        ewkt = shape.from_shape(geom_shapely, srid=4326)
+                yield item
+        finally:
+            stop.set()
 
-        start_date = self.mappings['start_date'].get('value') or \
-                     feature.GetField(self.mappings['start_date']['key'])
+            for thread in threads:
+                thread.join()
 
-        end_date = self.mappings['end_date'].get('value') or \
-                   feature.GetField(self.mappings['end_date']['key'])
+    def store(self, dataset_table):
+        """Store the data into database using Storager strategy.
 
+        Storagers which set the attribute `columnar` receive the `DataSet` as is.
+        Otherwise, the samples are converted to a list of dict. The `CopyStorager`
+        with `workers` splits the batches across several pooled connections.
+        The files loaded by `Driver.load_data_sets` are recorded as stored in `Driver.manifest`.
+        """
         try:
-            collection_date = self.mappings['collection_date'].get('value') or \
-                              feature.GetField(self.mappings['collection_date']['key'])
-            collection_date = get_date_from_str(collection_date)
-        except:
-            collection_date = None
-
-        start_date = get_date_from_str(start_date)
-        end_date = get_date_from_str(end_date)
-
-        class_id = feature.GetField(self.mappings['class_id'])
-
-        return {
-            "start_date": start_date,
-            "end_date": end_date,
-            "collection_date": collection_date,
-            "location": ewkt,
-            "class_id": class_id,
-            "user_id": self.user
-        }
+            self._store_data_set(self._data_sets, dataset_table)
+        finally:
+            self._close_dedupe()
 
-    def load(self, file):
-        """Load datasource."""
-        dataSource = ogr.Open(file)
+        for f, rows in self._loaded_files:
+            self._checkpoint(f, STORED, rows)
 
-        # Check to see if shapefile is found.
-        if dataSource is None:
-            raise Exception("Could not open {}".format(file))
-        else:
-            self.load_classes(dataSource)
+        self._loaded_files = []
 
-            for layer_id in range(dataSource.GetLayerCount()):
-                gdal_layer = dataSource.GetLayer(layer_id)
+    def _close_dedupe(self):
+        """Release the hashes of `Driver.dedupe`, removing its spilled runs. The counters are kept."""
+        if self.dedupe is not None:
+            self.dedupe.close()
 
-                spatial_ref = gdal_layer.GetSpatialRef()
+    def _deduplicate(self, data_set):
+        """Drop or count the samples already seen by `Driver.dedupe`."""
+        if self.dedupe is None:
+            return data_set
 
-                if spatial_ref is None:
-                    spatial_ref = osr.SpatialReference()
-                    spatial_ref.ImportFromEPSG(4326)
-                    logging.info('Dataset {} does not have projection. Using EPSG:4326...'.format(file))
+        with self.metrics.stage('dedupe') as metrics:
+            duplicates = self.dedupe.duplicates
 
-                self.crs = spatial_ref.ExportToProj4()
+            data_set = self.dedupe.filter(data_set)
 
-                gdal_layer.ResetReading()
+            metrics.rows = self.dedupe.duplicates - duplicates
 
-                for feature in gdal_layer:
-                    dataset = self.build_data_set(feature, **{"layer": gdal_layer})
-                    self._data_sets.append(dataset)
+        return data_set
 
-    def load_classes(self, file):
-        """Load classes of a file."""
-        # Retrieves Layer Name from Data set filename
-        layer_name = Path(file.GetName()).stem
+    def _store_data_set(self, data_set, dataset_table):
+        data_set = self._deduplicate(data_set)
 
-        unique_classes = self.get_unique_classes(file, layer_name)
+        with self.metrics.stage('store') as metrics:
+            if getattr(self.storager, 'columnar', False):
+                self.storager.store_data(data_set, dataset_table)
+            else:
+                self.storager.store_data(data_set.to_dicts(), dataset_table)
 
-        self.validate_classes(unique_classes)
+            metrics.rows = len(data_set)
 
-        return
+
+class CSV(Driver):
+    """Defines a Base class for handle CSV data files.
+
+    Basically, a CSV is built with a mappings config.
+    The config describes how to read the dataset in order to
+    create a Brazil Data Cube sample. The `mappings`
+    must include at least the required fields to fill
+    a sample, such latitude, longitude and class_id fields.
+    """
+
+    extensions = {
+        'csv': ('.csv',),
+        'json': ('.json',),
+        'jsonl': ('.jsonl', '.ndjson'),
+    }
+
+    mimetypes = {
+        'csv': ('text/csv', 'application/vnd.ms-excel'),
+        'json': ('application/json',),
+        'jsonl': ('application/x-ndjson', 'application/jsonl', 'application/jsonlines'),
+    }
+
+    def __init__(self, entries, mappings, storager=None, engine='pandas', **kwargs):
+        """Init method.
+
+        Args:
+            entries (string|io.IOBase) - The file entries
+            mappings (dict) - CSV Mappings to Sample
+            storager (PostgisAccessor) - The PostgisAccessor from utils
+            engine (str) - The CSV parser, `pandas` or `pyarrow`. The `pyarrow` parser
+                uses several threads, memory maps the local files and reads only
+                the mapped columns. It requires the extra ``parquet``. The JSON
+                files are always read by pandas.
+
+        """
+        if engine not in ('pandas', 'pyarrow'):
+            raise ValueError(f'Invalid CSV engine {engine}')
+
+        copy_mappings = deepcopy(mappings)
+
+        validate_mappings(copy_mappings)
+
+        super(CSV, self).__init__(storager, **kwargs)
+
+        self.mappings = copy_mappings
+        self.entries = entries
+        self.engine = engine
+
+    def get_files(self):
+        """Get files."""
+        if is_stream(self.entries) or \
+                os.path.isfile(self.entries):
+            return [self.entries]
+
+        files = os.listdir(self.entries)
+
+        extensions = sum(self.extensions.values(), ())
+
+        return [
+            os.path.join(self.entries, f) for f in files if f.endswith(extensions)
+        ]
+
+    @classmethod
+    def get_format(cls, file):
+        """Retrieve the format of file, one of `csv`, `json` or `jsonl` (line-delimited JSON)."""
+        mimetype = getattr(file, 'mimetype', None)
+
+        if isinstance(file, str):
+            name = file
+        else:
+            name = getattr(file, 'filename', None) or getattr(file, 'name', None) or ''
+
+        for file_format, extensions in cls.extensions.items():
+            if mimetype in cls.mimetypes[file_format] or str(name).endswith(extensions):
+                return file_format
+
+        return 'csv'
+
+    def read(self, file, file_format=None):
+        """Read the file as data frames with at most `chunk_size` rows, which are parsed as iterated.
+
+        Streams are read from the start, so they can be read again after `Driver.validate`.
+
+        Args:
+            file (str|FileStorage) - The file path or stream
+            file_format (str) - The file format. Default is None, which uses `CSV.get_format`.
+
+        """
+        file_format = file_format or self.get_format(file)
+
+        if is_stream(file):
+            getattr(file, 'stream', file).seek(0)
+
+        if file_format == 'jsonl':
+            if self.chunk_size:
+                yield from pd.read_json(file, lines=True, chunksize=self.chunk_size)
+            else:
+                yield pd.read_json(file, lines=True)
+
+            return
+
+        if file_format == 'json':
+            # A JSON document must be parsed at once. Only the build is chunked.
+            csv = pd.read_json(file)
+
+            if not self.chunk_size:
+                yield csv
+                return
+
+            for i in range(0, len(csv), self.chunk_size):
+                yield csv.iloc[i:i + self.chunk_size]
+
+            return
+
+        if self.engine == 'pyarrow':
+            yield from self.read_arrow(file)
+        elif self.chunk_size:
+            yield from pd.read_csv(file, chunksize=self.chunk_size)
+        else:
+            yield pd.read_csv(file)
+
+    def read_arrow(self, file):
+        """Read a CSV file with the multithreaded parser of pyarrow, yielding data frames of at most `chunk_size` rows.
+
+        Only the mapped columns are parsed (See `Driver.get_mapped_columns`). The date
+        and class name columns are read as text, which is parsed by `CSV.build_data_set`.
+        """
+        source = self.open_arrow_source(file)
+
+        try:
+            header = self.read_header(source)
+
+            columns = []
+
+            for column in self.get_mapped_columns():
+                if column in header:
+                    columns.append(column)
+                elif column != self.mappings['collection_date'].get('key'):
+                    raise KeyError(f'Missing column {column}')
+
+            text_columns = [self.mappings[field]['key'] for field in ('start_date', 'end_date', 'collection_date')
+                            if not self.mappings[field].get('value')]
+
+            if self.has_class_names():
+                text_columns.append(self.get_class_column())
+
+            convert_options = pacsv.ConvertOptions(
+                include_columns=columns,
+                column_types={column: pa.string() for column in text_columns if column in columns}
+            )
+
+            if not self.chunk_size:
+                yield pacsv.read_csv(source, convert_options=convert_options).to_pandas()
+                return
+
+            batches = pacsv.open_csv(source, convert_options=convert_options)
+            pending, rows = [], 0
+
+            # The parser yields blocks of bytes, which are sliced into chunks of rows
+            for batch in batches:
+                pending.append(batch)
+                rows += batch.num_rows
+
+                while rows >= self.chunk_size:
+                    table = pa.Table.from_batches(pending)
+
+                    yield table.slice(0, self.chunk_size).to_pandas()
+
+                    table = table.slice(self.chunk_size)
+                    pending, rows = table.to_batches(), table.num_rows
+
+            if rows:
+                yield pa.Table.from_batches(pending, schema=batches.schema).to_pandas()
+        finally:
+            source.close()
+
+    @staticmethod
+    def open_arrow_source(file):
+        """Open a file for pyarrow: the local files are memory mapped and the text streams are encoded."""
+        if isinstance(file, (str, os.PathLike)):
+            return pa.memory_map(str(file))
+
+        # Already opened by `CSV.read_chunks`
+        if isinstance(file, pa.NativeFile):
+            return file
+
+        stream = getattr(file, 'stream', file)
+        stream.seek(0)
+
+        if isinstance(stream, io.TextIOBase):
+            return pa.BufferReader(stream.read().encode('utf-8'))
+
+        return pa.PythonFile(stream, mode='r')
+
+    @staticmethod
+    def read_header(source):
+        """Read the column names of a CSV source, keeping its position."""
+        position = source.tell()
+
+        line = b''
+
+        while not line.endswith(b'\n'):
+            block = source.read(4096)
+
+            if not block:
+                break
+
+            line += block
+
+        source.seek(position)
+
+        first_line = line.split(b'\n', 1)[0].decode('utf-8-sig').rstrip('\r')
+
+        return next(csv_reader([first_line]), [])
+
+    def build_data_set(self, csv, class_ids=None):
+        """Build dataset sample data.
+
+        Args:
+            csv(pd.DataFrame) - Open CSV file
+            class_ids (numpy.ndarray) - The class identifiers resolved by `Driver.resolve_classes`.
+                Default is the class column, whose class names are resolved when `class_name` is mapped.
+
+        Returns:
+            GeoDataFrame CSV with geospatial location as EWKB
+
+        """
+        srid = self.get_srid()
+
+        if 'longitude' in self.mappings and 'latitude' in self.mappings:
+            # Reproject and build the whole point column at once from the coordinate arrays
+            x, y = reproject_coordinates(csv[self.mappings['longitude']].to_numpy(dtype=float),
+                                         csv[self.mappings['latitude']].to_numpy(dtype=float),
+                                         srid, 4326)
+            geom_column = geopandas.points_from_xy(x, y)
+            geocsv = geopandas.GeoDataFrame(csv,
+                                            crs=4326,
+                                            geometry=geom_column)
+            if 'latitude' in geocsv:
+                del geocsv['latitude']
+            if 'longitude' in geocsv:
+                del geocsv['longitude']
+
+        else:
+            geom_column = geopandas.GeoSeries(reproject_shapes(shapely.from_wkt(csv[self.mappings['geom']].to_numpy()),
+                                                               srid, 4326),
+                                              index=csv.index, crs=4326)
+            geocsv = geopandas.GeoDataFrame(csv, crs=4326, geometry=geom_column)
+
+        geocsv['location'] = to_ewkb(geocsv.geometry.to_numpy(), srid=4326)
+
+        if class_ids is None:
+            class_column = csv[self.get_class_column()]
+            class_ids = self.resolve_classes(class_column) if self.has_class_names() else class_column.to_numpy()
+
+        geocsv['class_id'] = class_ids
+
+        # Dates given by value in mappings are constants (See `Driver.get_constants`)
+        for field in ('start_date', 'end_date', 'collection_date'):
+            if self.mappings[field].get('value'):
+                continue
+
+            key = self.mappings[field]['key']
+
+            if key in geocsv.columns:
+                geocsv[field] = parse_dates(geocsv[key])
+            elif field == 'collection_date':
+                geocsv[field] = None
+            else:
+                raise KeyError(f'Missing column {key} for {field}')
+
+        # Delete id column to avoid DuplicateError on database
+        if 'id' in geocsv.columns:
+            del geocsv['id']
+
+        if 'geometry' in geocsv.columns:
+            del geocsv['geometry']
+
+        return geocsv
+
+    def get_srid(self):
+        """Retrieve the SRID of the coordinates or geometries of samples, given by `srid` in mappings.
+
+        The samples are reprojected to EPSG:4326 when it is other SRID.
+        """
+        srid = self.mappings.get('srid') or 4326
+
+        return int(srid) if isinstance(srid, str) and srid.isdigit() else srid
+
+    def get_unique_classes(self, csv):
+        """Retrieve distinct sample classes from CSV datasource."""
+        return csv[self.get_class_column()].unique()
+
+    def load(self, file):
+        """Load file."""
+        for data_set in self.load_chunks(file):
+            self._data_sets.extend(data_set)
+
+    def load_chunks(self, file):
+        """Open the file and yield the samples in chunks of at most `chunk_size` rows."""
+        for csv in self.read_chunks(file):
+            yield self.transform_chunk(file, csv)
+
+    def read_chunks(self, file):
+        """Open the file and yield the data frames of at most `chunk_size` rows.
+
+        The local files are opened here, so the bytes read by each chunk are
+        measured by the position of file (See `StageMetrics.bytes_read`).
+        """
+        if not isinstance(file, (str, os.PathLike)):
+            stream = getattr(file, 'stream', file)
+
+            yield from self.metrics.timed_iter('read', self.read(file), file, position=stream.tell)
+            return
+
+        file_format = self.get_format(file)
+
+        if file_format == 'csv' and self.engine == 'pyarrow':
+            source = pa.memory_map(str(file))
+        else:
+            source = open(file, 'rb')
+
+        with source:
+            yield from self.metrics.timed_iter('read', self.read(source, file_format), file,
+                                               position=source.tell)
+
+    def check_chunk(self, file, chunk, report):
+        """Check a data frame, including the coordinates, without building the geometries."""
+        self.check_frame(file, chunk, report)
+
+        if 'longitude' in self.mappings and 'latitude' in self.mappings:
+            longitude, latitude = self.mappings['longitude'], self.mappings['latitude']
+
+            if longitude in chunk.columns and latitude in chunk.columns:
+                report.out_of_bounds += count_out_of_bounds(pd.to_numeric(chunk[longitude], errors='coerce'),
+                                                            pd.to_numeric(chunk[latitude], errors='coerce'),
+                                                            self.get_srid())
+        elif self.mappings['geom'] in chunk.columns:
+            report.missing_geometries += int(chunk[self.mappings['geom']].isna().sum())
+
+    def transform_chunk(self, file, chunk):
+        """Resolve the classes of a data frame and build its `DataSet`."""
+        with self.metrics.stage('validate_classes', file) as metrics:
+            class_ids = self.resolve_classes(chunk[self.get_class_column()])
+
+            metrics.rows = len(chunk)
+
+        with self.metrics.stage('transform', file) as metrics:
+            res = self.build_data_set(chunk, class_ids=class_ids)
+
+            data_set = DataSet()
+            data_set.append(res, **self.get_constants())
+
+            metrics.rows = len(data_set)
+
+        return data_set
+
+    def load_classes(self, file):
+        """Load classes of a file."""
+        unique_classes = self.get_unique_classes(file)
+
+        self.validate_classes(unique_classes)
+
+        return
+
+
+class Shapefile(Driver):
+    """Base class for Shapefiles Reader.
+
+    It reads any vector format supported by OGR. The subclasses
+    only change the `extensions` of the files to read.
+    """
+
+    extensions = ('.shp',)
+
+    def __init__(self, entries, mappings, storager=None, reader='ogr', bbox=None, **kwargs):
+        """Init method.
+
+        Args:
+            entries (string|FileStorage) - The zip file or directory of shapefiles
+            mappings (dict) - Shapefile Mappings to Sample
+            storager (PostgisAccessor) - The PostgisAccessor from utils
+            reader (str) - How layers are read. `ogr` iterates feature by feature and
+                `arrow` reads columnar record batches (Requires GDAL 3.6+).
+            bbox (tuple) - Read only the features which intersect the box (minx, miny, maxx, maxy)
+                in EPSG:4326, using the spatial index of format, if any.
+
+        """
+        if reader not in ('ogr', 'arrow'):
+            raise ValueError(f'Invalid reader {reader}')
+
+        copy_mappings = deepcopy(mappings)
+
+        validate_mappings(copy_mappings)
+
+        super(Shapefile, self).__init__(storager, **kwargs)
+
+        self.mappings = copy_mappings
+        self.entries = entries
+        self.reader = reader
+        self.bbox = bbox
+        self.temporary_folder = None
+        self._memory_files = []
+        self.class_id = None
+        self.start_date = None
+        self.end_date = None
+        self.collection_date = None
+        self.crs = None
+
+    def get_worker_state(self):
+        """Retrieve the state sent to worker processes, without the archive files."""
+        state = super(Shapefile, self).get_worker_state()
+        state['temporary_folder'] = None
+        state['_memory_files'] = []
+
+        return state
+
+    def __enter__(self):
+        """Use the driver as context manager, which releases the archive files on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Release the archive files."""
+        self.close()
+
+    def close(self):
+        """Release the in-memory archives and remove the temporary folder, if any."""
+        for path in self._memory_files:
+            gdal.Unlink(path)
+
+        self._memory_files = []
+
+        if self.temporary_folder is not None:
+            self.temporary_folder.cleanup()
+            self.temporary_folder = None
+
+    def load_data_sets(self):
+        """Load data sets in memory using database format, releasing the archive files at end."""
+        try:
+            return super(Shapefile, self).load_data_sets()
+        finally:
+            self.close()
+
+    def iter_chunks(self):
+        """Iterate over the chunks of all files, releasing the archive files at end."""
+        try:
+            yield from super(Shapefile, self).iter_chunks()
+        finally:
+            self.close()
+
+    def validate(self, max_errors=100):
+        """Check the files without loading them, releasing the archive files at end."""
+        try:
+            return super(Shapefile, self).validate(max_errors=max_errors)
+        finally:
+            self.close()
+
+    def check_file(self, file, report):
+        """Check the layers of a datasource.
+
+        The coordinates are checked by the layer extent and the
+        mapped fields are read without the feature geometries.
+        """
+        dataSource = ogr.Open(file)
+
+        if dataSource is None:
+            raise Exception("Could not open {}".format(file))
+
+        for layer_id in range(dataSource.GetLayerCount()):
+            layer = dataSource.GetLayer(layer_id)
+            crs = self.get_layer_crs(layer, file)
+
+            minx, maxx, miny, maxy = layer.GetExtent()
+
+            if count_out_of_bounds([minx, maxx], [miny, maxy], crs):
+                report.add_error(file, f'The extent of layer {layer.GetName()} is out of EPSG:4326 bounds')
+
+            definition = layer.GetLayerDefn()
+            names = [definition.GetFieldDefn(i).GetName() for i in range(definition.GetFieldCount())]
+            columns = self.get_field_columns()
+            keys = [name for name in columns if name in names]
+
+            layer.SetIgnoredFields([name for name in names if name not in keys] + ['OGR_GEOMETRY', 'OGR_STYLE'])
+            layer.ResetReading()
+
+            try:
+                rows = []
+
+                for feature in layer:
+                    rows.append([feature.GetField(key) for key in keys])
+
+                    if len(rows) == (self.chunk_size or 65536):
+                        self.check_frame(file, pd.DataFrame(rows, columns=keys), report, columns=columns)
+                        rows = []
+
+                if rows:
+                    self.check_frame(file, pd.DataFrame(rows, columns=keys), report, columns=columns)
+            finally:
+                layer.SetIgnoredFields([])
+
+    def check_chunk(self, file, chunk, report):
+        """Check a batch of the `arrow` reader, without parsing the geometries."""
+        if isinstance(chunk, DataSet):
+            return super(Shapefile, self).check_chunk(file, chunk, report)
+
+        frame, geometries, _ = chunk
+
+        self.check_frame(file, frame, report, columns=self.get_field_columns())
+
+        report.missing_geometries += int(pd.isna(geometries).sum())
+
+    def get_field_columns(self):
+        """Retrieve the mapped columns which are attributes of features, that is, without the geometry."""
+        return [column for column in self.get_mapped_columns() if column != self.mappings.get('geom')]
+
+    def get_unique_classes(self, ogr_file, layer_name):
+        """Retrieve distinct sample classes from shapefile datasource.
+
+        Only the class field of features is read. The loading does not use it,
+        since the classes are validated while the features are read.
+        """
+        classes = self.get_class_column()
+
+        if not isinstance(classes, str):
+            return classes['value']
+
+        layer = ogr_file.GetLayer(layer_name)
+        definition = layer.GetLayerDefn()
+
+        layer.SetIgnoredFields([definition.GetFieldDefn(i).GetName() for i in range(definition.GetFieldCount())
+                                if definition.GetFieldDefn(i).GetName() != classes] + ['OGR_GEOMETRY', 'OGR_STYLE'])
+        layer.ResetReading()
+
+        try:
+            return list({feature.GetField(classes) for feature in layer})
+        finally:
+            layer.SetIgnoredFields([])
+
+    def get_files(self):
+        """Get files.
+
+        The shapefiles of a zip are read in place through the GDAL
+        virtual file systems (``/vsizip/``), without extraction.
+        """
+        if is_stream(self.entries):
+            stream = getattr(self.entries, 'stream', self.entries)
+            stream.seek(0)
+
+            if not is_zipfile(stream):
+                return [self.get_memory_file(stream)]
+
+        if is_stream(self.entries) or self.entries.endswith('.zip'):
+            return self.get_zip_files()
+
+        if os.path.isfile(self.entries) and self.entries.endswith(self.extensions):
+            return [self.entries]
+
+        files = os.listdir(self.entries)
+
+        return [
+            os.path.join(self.entries, f) for f in files if f.endswith(self.extensions)
+        ]
+
+    def get_memory_file(self, stream):
+        """Copy an uploaded file, which is not a zip, into a GDAL in-memory file (``/vsimem/``)."""
+        name = getattr(self.entries, 'filename', None) or getattr(self.entries, 'name', None) or ''
+
+        path = f'/vsimem/{uuid4().hex}{os.path.splitext(str(name))[1] or self.extensions[0]}'
+
+        stream.seek(0)
+        gdal.FileFromMemBuffer(path, stream.read())
+
+        self._memory_files.append(path)
+
+        return path
+
+    def get_fingerprint(self, file):
+        """Retrieve the content hash of a shapefile and its sidecar files.
+
+        The other formats, such GeoPackage, are a single file, whose content is hashed.
+        The files are read through GDAL, which supports the files inside zip archives.
+        """
+        base, file_extension = os.path.splitext(file)
+
+        if file_extension.lower() != '.shp':
+            if not file.startswith('/vsi'):
+                return hash_file(file)
+
+            base, extensions = file, ('',)
+        else:
+            extensions = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+        digest = hashlib.sha256()
+
+        for extension in extensions:
+            path = base + extension
+
+            if gdal.VSIStatL(path) is None:
+                continue
+
+            digest.update(extension.encode())
+
+            handle = gdal.VSIFOpenL(path, 'rb')
+
+            try:
+                block = gdal.VSIFReadL(1, 1 << 20, handle)
+
+                while block:
+                    digest.update(block)
+                    block = gdal.VSIFReadL(1, 1 << 20, handle)
+            finally:
+                gdal.VSIFCloseL(handle)
+
+        return digest.hexdigest()
+
+    def get_zip_files(self):
+        """Get the files with one of `extensions` inside the zip entries.
+
+        Uploaded streams are copied into a GDAL in-memory file (``/vsimem/``).
+        They are only extracted into a temporary folder when loading with `workers`,
+        since the in-memory files are not shared between processes.
+        Use `Shapefile.close` to release them.
+        """
+        stream = getattr(self.entries, 'stream', self.entries)
+
+        if not isinstance(stream, str):
+            stream.seek(0)
+
+        with ZipFile(stream) as zip_object:
+            names = [name for name in zip_object.namelist() if name.endswith(self.extensions)]
+
+        if isinstance(stream, str):
+            archive = stream
+        elif self.workers:
+            if self.temporary_folder is None:
+                self.temporary_folder = TemporaryDirectory()
+
+                stream.seek(0)
+                unzip(stream, self.temporary_folder.name)
+
+            return [os.path.join(self.temporary_folder.name, name) for name in names]
+        else:
+            archive = f'/vsimem/{uuid4().hex}.zip'
+
+            stream.seek(0)
+            gdal.FileFromMemBuffer(archive, stream.read())
+
+            self._memory_files.append(archive)
+
+        return [f'/vsizip/{archive}/{name}' for name in names]
+
+    def build_data_set(self, feature, **kwargs):
+        """Build dataset sample data.
+
+        The fields which are constant for every feature are
+        not included (See `Driver.get_constants`).
+        """
+        geometry = feature.GetGeometryRef()
+
+        reproject(geometry, self.crs, target_srid=4326)
+
+        data_set = {
+            "location": wkb_to_ewkb(geometry.ExportToWkb(), srid=4326),
+            "class_id": feature.GetField(self.get_class_column())
+        }
+
+        if not self.mappings['start_date'].get('value'):
+            data_set['start_date'] = get_date_from_str(feature.GetField(self.mappings['start_date']['key']),
+                                                       errors='ignore')
+
+        if not self.mappings['end_date'].get('value'):
+            data_set['end_date'] = get_date_from_str(feature.GetField(self.mappings['end_date']['key']),
+                                                     errors='ignore')
+
+        if not self.mappings['collection_date'].get('value'):
+            try:
+                collection_date = feature.GetField(self.mappings['collection_date']['key'])
+                data_set['collection_date'] = get_date_from_str(collection_date, errors='ignore')
+            except:
+                data_set['collection_date'] = None
+
+        return data_set
+
+    def load(self, file):
+        """Load datasource."""
+        for data_set in self.load_chunks(file):
+            self._data_sets.extend(data_set)
+
+    def load_chunks(self, file):
+        """Open the datasource and yield the features in chunks of at most `chunk_size` samples."""
+        for chunk in self.read_chunks(file):
+            yield self._transform(file, chunk)
+
+    def read_chunks(self, file):
+        """Open the datasource and yield its chunks of at most `chunk_size` features.
+
+        The `arrow` reader yields tuples of (attributes, geometries, crs), which are built
+        by `Shapefile.transform_chunk`. The `ogr` reader builds the features while reading
+        them and yields `DataSet`. The features are read once: the classes of each chunk
+        are validated when it is built (See `Driver.resolve_classes`).
+        """
+        dataSource = ogr.Open(file)
+
+        # Check to see if shapefile is found.
+        if dataSource is None:
+            raise Exception("Could not open {}".format(file))
+
+        for layer_id in range(dataSource.GetLayerCount()):
+            gdal_layer = dataSource.GetLayer(layer_id)
+
+            self.crs = self.get_layer_crs(gdal_layer, file)
+
+            if self.bbox is not None:
+                gdal_layer.SetSpatialFilterRect(*self.get_layer_bbox(self.crs))
+
+            gdal_layer.ResetReading()
+
+            if self.reader == 'arrow':
+                batches = self.metrics.timed_iter('read', self.read_batches(gdal_layer), file,
+                                                  rows=lambda batch: len(batch[0]))
+
+                for frame, geometries in batches:
+                    yield frame, geometries, self.crs
+
+                continue
+
+            # Features are built while they are read, so the read stage includes the transform
+            yield from self.metrics.timed_iter('read', self.read_features(gdal_layer), file)
+
+    @staticmethod
+    def get_layer_crs(layer, file=None):
+        """Retrieve the coordinate reference system of a layer as PROJ.4, which is EPSG:4326 when not set."""
+        spatial_ref = layer.GetSpatialRef()
+
+        if spatial_ref is None:
+            spatial_ref = osr.SpatialReference()
+            spatial_ref.ImportFromEPSG(4326)
+            logging.info('Dataset {} does not have projection. Using EPSG:4326...'.format(file))
+
+        return spatial_ref.ExportToProj4()
+
+    def get_layer_bbox(self, crs):
+        """Retrieve the `bbox` in the coordinate reference system of a layer."""
+        if crs == 4326:
+            return tuple(self.bbox)
+
+        return get_transformer(4326, crs).transform_bounds(*self.bbox)
+
+    def transform_chunk(self, file, chunk):
+        """Resolve the classes of a batch yielded by the `arrow` reader and build it into a `DataSet`."""
+        frame, geometries, crs = chunk
+
+        with self.metrics.stage('validate_classes', file) as metrics:
+            class_ids = self.resolve_classes(frame[self.get_class_column()])
+
+            metrics.rows = len(frame)
+
+        with self.metrics.stage('transform', file) as metrics:
+            data_set = DataSet()
+            data_set.append(self.build_data_frame(frame, geometries, crs=crs, class_ids=class_ids),
+                            **self.get_constants())
+
+            metrics.rows = len(data_set)
+
+        return data_set
+
+    def read_features(self, layer):
+        """Read and build the layer feature by feature, yielding chunks of at most `chunk_size` samples."""
+        # Accumulate the layer by columns instead of one dict per feature
+        columns = defaultdict(list)
+        size = 0
+
+        for feature in layer:
+            dataset = self.build_data_set(feature, **{"layer": layer})
+
+            for column, value in dataset.items():
+                columns[column].append(value)
+
+            size += 1
+
+            if self.chunk_size and size == self.chunk_size:
+                yield self._make_chunk(columns)
+                columns, size = defaultdict(list), 0
+
+        if size > 0:
+            yield self._make_chunk(columns)
+
+    def read_batches(self, layer):
+        """Read the layer as columnar batches of at most `chunk_size` features.
+
+        It uses the GDAL Arrow stream interface, which reads the
+        features in bulk instead of one by one.
+
+        Args:
+            layer (ogr.Layer) - The layer to read
+
+        Returns:
+            Iterator of tuple (pandas.DataFrame, numpy.ndarray) - The attributes and the WKB geometries of batch
+
+        """
+        if not hasattr(layer, 'GetArrowStreamAsNumPy'):
+            raise RuntimeError('The arrow reader requires GDAL 3.6+')
+
+        options = [f'MAX_FEATURES_IN_BATCH={self.chunk_size or 65536}', 'INCLUDE_FID=NO']
+
+        geometry_column = layer.GetGeometryColumn() or 'wkb_geometry'
+
+        for batch in layer.GetArrowStreamAsNumPy(options=options):
+            geometries = batch.pop(geometry_column)
+
+            frame = pd.DataFrame(dict(batch))
+
+            # Strings are read as bytes
+            for column in frame.columns:
+                values = frame[column]
+
+                if values.dtype == object and len(values) and isinstance(values.iloc[0], bytes):
+                    frame[column] = values.str.decode('utf-8')
+
+            yield frame, geometries
+
+    def build_data_frame(self, frame, geometries, crs=None, class_ids=None):
+        """Build dataset sample data for a whole batch of features.
+
+        It is the columnar version of `Shapefile.build_data_set`.
+
+        Args:
+            frame (pandas.DataFrame) - The feature attributes
+            geometries (numpy.ndarray) - The feature geometries as WKB
+            crs (str) - The coordinate reference system of geometries. Default is the current layer CRS.
+            class_ids (numpy.ndarray) - The class identifiers resolved by `Driver.resolve_classes`.
+                Default is the class field, whose class names are resolved when `class_name` is mapped.
+
+        Returns:
+            pandas.DataFrame - The samples, without constant fields.
+
+        """
+        shapes = reproject_shapes(shapely.from_wkb(geometries), crs or self.crs, 4326)
+
+        if class_ids is None:
+            class_ids = frame[self.get_class_column()].to_numpy()
+            class_ids = self.resolve_classes(class_ids) if self.has_class_names() else class_ids
+
+        data_set = pd.DataFrame(dict(
+            location=to_ewkb(shapes, srid=4326),
+            class_id=class_ids
+        ))
+
+        for field in ('start_date', 'end_date', 'collection_date'):
+            if self.mappings[field].get('value'):
+                continue
+
+            key = self.mappings[field]['key']
+
+            if key not in frame.columns:
+                if field != 'collection_date':
+                    raise KeyError(f'Missing field {key} for {field}')
+
+                data_set[field] = None
+                continue
+
+            data_set[field] = parse_dates(frame[key]).to_numpy()
+
+        return data_set
+
+    def _make_chunk(self, columns):
+        # The classes are validated once per chunk, as they are read
+        columns['class_id'] = self.resolve_classes(columns['class_id'])
+
+        data_set = DataSet()
+        data_set.append(pd.DataFrame(columns), **self.get_constants())
+
+        return data_set
+
+    def load_classes(self, file):
+        """Load classes of all the layers of a datasource."""
+        unique_classes = []
+
+        for layer_id in range(file.GetLayerCount()):
+            unique_classes.extend(self.get_unique_classes(file, file.GetLayer(layer_id).GetName()))
+
+        self.validate_classes(unique_classes)
+
+        return
+
+
+class GeoPackage(Shapefile):
+    """Driver for GeoPackage files.
+
+    All the layers are read, using the GDAL Arrow reader by default.
+    With `bbox`, the features are selected using the R-tree of layer.
+    """
+
+    extensions = ('.gpkg',)
+
+    def __init__(self, entries, mappings, storager=None, reader='arrow', **kwargs):
+        """Init method.
+
+        Args:
+            entries (string|FileStorage) - The GeoPackage, a zip of GeoPackages or a directory
+            mappings (dict) - Mappings to Sample
+            storager (PostgisAccessor) - The PostgisAccessor from utils
+            reader (str) - How layers are read (See `Shapefile`)
+
+        """
+        super(GeoPackage, self).__init__(entries, mappings, storager, reader=reader, **kwargs)
+
+
+class FlatGeobuf(Shapefile):
+    """Driver for FlatGeobuf files.
+
+    The features are read using the GDAL Arrow reader by default.
+    With `bbox`, they are selected using the packed R-tree of file.
+    """
+
+    extensions = ('.fgb',)
+
+    def __init__(self, entries, mappings, storager=None, reader='arrow', **kwargs):
+        """Init method.
+
+        Args:
+            entries (string|FileStorage) - The FlatGeobuf, a zip of FlatGeobuf files or a directory
+            mappings (dict) - Mappings to Sample
+            storager (PostgisAccessor) - The PostgisAccessor from utils
+            reader (str) - How layers are read (See `Shapefile`)
+
+        """
+        super(FlatGeobuf, self).__init__(entries, mappings, storager, reader=reader, **kwargs)
+
+
+class GeoParquet(Shapefile):
+    """Driver for GeoParquet files, read with ``pyarrow`` instead of OGR.
+
+    The files are read by record batches of at most `chunk_size` rows,
+    with only the columns used by the mappings. With `bbox`, the row groups
+    outside it are skipped using the statistics of the bounding box covering
+    column of GeoParquet 1.1, when the file has one.
+    Only the WKB geometry encoding is supported.
+    """
+
+    extensions = ('.parquet', '.geoparquet')
+
+    def __init__(self, entries, mappings, storager=None, **kwargs):
+        """Init method.
+
+        Args:
+            entries (string|FileStorage) - The GeoParquet file or directory
+            mappings (dict) - Mappings to Sample
+            storager (PostgisAccessor) - The PostgisAccessor from utils
+
+        """
+        super(GeoParquet, self).__init__(entries, mappings, storager, reader='arrow', **kwargs)
+
+    def get_files(self):
+        """Get files."""
+        if is_stream(self.entries) or os.path.isfile(self.entries):
+            return [self.entries]
+
+        files = os.listdir(self.entries)
+
+        return [
+            os.path.join(self.entries, f) for f in files if f.endswith(self.extensions)
+        ]
+
+    def get_fingerprint(self, file):
+        """Retrieve the content hash of file."""
+        return hash_file(file)
+
+    def check_file(self, file, report):
+        """Check the batches of a file, without parsing the geometries."""
+        return Driver.check_file(self, file, report)
+
+    def read_chunks(self, file):
+        """Open the file and yield its batches as tuples of (attributes, geometries, crs)."""
+        stream = getattr(file, 'stream', file)
+
+        if not isinstance(stream, str):
+            stream.seek(0)
+
+        parquet_file = pq.ParquetFile(stream)
+
+        metadata = parquet_file.schema_arrow.metadata or dict()
+
+        if b'geo' not in metadata:
+            raise ValueError(f'{file} is not a GeoParquet file')
+
+        geo = json.loads(metadata[b'geo'])
+        geometry_column = geo['primary_column']
+        column = geo['columns'][geometry_column]
+
+        if column.get('encoding', 'WKB') != 'WKB':
+            raise ValueError(f'Unsupported GeoParquet geometry encoding {column["encoding"]}')
+
+        self.crs = crs = self.get_srid(column.get('crs'))
+
+        names = parquet_file.schema_arrow.names
+        columns = [name for name in self.get_mapped_columns() if name in names and name != geometry_column]
+
+        row_groups = range(parquet_file.num_row_groups)
+        covering = (column.get('covering') or dict()).get('bbox')
+        bbox = None
+
+        if self.bbox is not None:
+            bbox = self.get_layer_bbox(crs)
+
+            if covering is not None:
+                row_groups = self.select_row_groups(parquet_file, covering, bbox)
+
+        batches = parquet_file.iter_batches(batch_size=self.chunk_size or 65536, row_groups=list(row_groups),
+                                            columns=columns + [geometry_column])
+
+        for batch in self.metrics.timed_iter('read', batches, file, rows=lambda batch: batch.num_rows):
+            frame = batch.drop_columns([geometry_column]).to_pandas()
+            geometries = batch.column(geometry_column).to_numpy(zero_copy_only=False)
+
+            if bbox is not None:
+                inside = shapely.intersects(shapely.from_wkb(geometries), shapely.box(*bbox))
+
+                frame, geometries = frame[inside].reset_index(drop=True), geometries[inside]
+
+            yield frame, geometries, crs
+
+    @staticmethod
+    def select_row_groups(parquet_file, covering, bbox):
+        """Retrieve the row groups which may intersect the bounding box, using the covering column statistics.
+
+        Args:
+            parquet_file (pyarrow.parquet.ParquetFile) - The file
+            covering (dict) - The paths of bounding box columns from GeoParquet metadata
+            bbox (tuple) - The bounding box (minx, miny, maxx, maxy) in the file CRS
+
+        Returns:
+            list of int - The row groups
+
+        """
+        paths = {'.'.join(path): name for name, path in covering.items()}
+        minx, miny, maxx, maxy = bbox
+
+        row_groups = []
+
+        for index in range(parquet_file.num_row_groups):
+            row_group = parquet_file.metadata.row_group(index)
+            statistics = dict()
+
+            for position in range(row_group.num_columns):
+                chunk = row_group.column(position)
+
+                if chunk.path_in_schema in paths and chunk.statistics is not None \
+                        and chunk.statistics.has_min_max:
+                    statistics[paths[chunk.path_in_schema]] = chunk.statistics
+
+            if len(statistics) == 4 and (statistics['xmin'].min > maxx or statistics['xmax'].max < minx or
+                                         statistics['ymin'].min > maxy or statistics['ymax'].max < miny):
+                continue
+
+            row_groups.append(index)
+
+        return row_groups
+
+    @staticmethod
+    def get_srid(crs):
+        """Retrieve the SRID, or the WKT when it has no EPSG code, of a GeoParquet PROJJSON CRS."""
+        # The GeoParquet default is OGC:CRS84, which is EPSG:4326 in x/y order
+        if crs is None:
+            return 4326
+
+        crs = pyproj.CRS.from_user_input(crs)
+
+        if crs.to_authority() == ('OGC', 'CRS84'):
+            return 4326
+
+        return crs.to_epsg() or crs.to_wkt()
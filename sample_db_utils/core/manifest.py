@@ -0,0 +1,131 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the checkpoint manifest of files ingested by drivers."""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+LOADING = 'loading'
+"""Status of a file with some of its samples stored."""
+
+STORED = 'stored'
+"""Status of a file with all its samples stored."""
+
+
+def hash_file(path, block_size=1 << 20):
+    """Compute the SHA-256 of a file content.
+
+    Args:
+        path (str) - The file path
+        block_size (int) - Number of bytes read at once
+
+    Returns:
+        str - The hex digest
+
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Checkpoint of the files ingested by `Driver.load_and_store`, kept in a SQLite file.
+
+    It records the content hash and the status of each file, so a new
+    run skips the files already stored and unchanged, as the samples already
+    stored of a file partially stored.
+
+    The records are committed by the driver after each file, unless the
+    storager has an open transaction (See `CopyStorager`). In this case, use
+    the manifest as context manager around the storager transaction, which
+    commits the records only when the samples are committed::
+
+        with Manifest('ingest.sqlite') as manifest, storager:
+            driver.load_and_store(dataset_table)
+    """
+
+    def __init__(self, path):
+        """Init method.
+
+        Args:
+            path (str) - The SQLite file. It is created when not exists.
+
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, '
+                'hash TEXT NOT NULL, '
+                'status TEXT NOT NULL, '
+                'rows INTEGER, '
+                'updated REAL NOT NULL)'
+            )
+
+    def __enter__(self):
+        """Use the manifest as context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Commit the records or roll them back on error, and close the manifest."""
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+        self.close()
+
+    def get(self, path):
+        """Retrieve the record of a file.
+
+        Returns:
+            tuple (str, str, int) - The hash, status and number of stored samples, or None when not recorded
+
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT hash, status, rows FROM files WHERE path = ?', (str(path),)
+            ).fetchone()
+
+    def is_stored(self, path, fingerprint):
+        """Whether all the samples of file with the given content hash are stored."""
+        record = self.get(path)
+
+        return record is not None and record[0] == fingerprint and record[1] == STORED
+
+    def mark(self, path, fingerprint, status, rows=None):
+        """Record the status of a file, without committing it."""
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO files (path, hash, status, rows, updated) VALUES (?, ?, ?, ?, ?)',
+                (str(path), fingerprint, status, rows, time.time())
+            )
+
+    def commit(self):
+        """Commit the recorded statuses."""
+        with self._lock:
+            self._connection.commit()
+
+    def rollback(self):
+        """Discard the statuses recorded since the last commit."""
+        with self._lock:
+            self._connection.rollback()
+
+    def close(self):
+        """Close the SQLite file, discarding the statuses not committed."""
+        with self._lock:
+            self._connection.close()
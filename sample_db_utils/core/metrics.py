@@ -0,0 +1,268 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the instrumentation of the driver pipeline."""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_END = object()
+
+
+def get_memory():
+    """Retrieve the current resident memory of process in bytes, or None when not available.
+
+    It is read from ``/proc/self/statm``, which is only available on Linux.
+    """
+    try:
+        with open('/proc/self/statm') as stream:
+            pages = int(stream.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def get_size(file):
+    """Retrieve the size in bytes of a file path or a seekable stream, or None when unknown."""
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.getsize(file) if os.path.isfile(file) else None
+
+    stream = getattr(file, 'stream', file)
+
+    try:
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class StageMetrics:
+    """Metrics of a single run of a pipeline stage.
+
+    Attributes:
+        stage (str) - The stage name: get_files, load, read, validate_classes, transform, dedupe or store
+        file (str) - The file being processed, if any
+        started (float) - The start time as UNIX timestamp
+        wall_time (float) - The elapsed seconds
+        rows (int) - The number of samples processed
+        bytes_read (int) - The number of bytes read from the file by stage, when the reader exposes
+            its position. It is None for the OGR and GeoParquet readers.
+        peak_memory (int) - The peak resident memory of process sampled while the stage runs, in bytes.
+            The stages running at the same time, such the pipeline threads, share the process memory.
+
+    """
+
+    __slots__ = ('stage', 'file', 'started', 'wall_time', 'rows', 'bytes_read', 'peak_memory')
+
+    def __init__(self, stage, file=None):
+        """Init method."""
+        self.stage = stage
+        self.file = file
+        self.started = time.time()
+        self.wall_time = None
+        self.rows = None
+        self.bytes_read = None
+        self.peak_memory = None
+
+    def to_dict(self):
+        """Retrieve the metrics as a dict."""
+        data = {name: getattr(self, name) for name in self.__slots__}
+
+        if data['file'] is not None:
+            data['file'] = str(getattr(self.file, 'filename', None) or self.file)
+
+        return data
+
+
+class Metrics:
+    """Instrumentation surface of `Driver`.
+
+    Each stage of pipeline runs inside `Metrics.stage`, which measures
+    it and calls every callback with the `StageMetrics`. Without callbacks,
+    nothing is reported.
+
+    While any stage runs, a background thread samples the resident memory
+    of process every `sample_interval` seconds for the peak memory of stages.
+    """
+
+    def __init__(self, *callbacks, sample_interval=0.01):
+        """Init method.
+
+        Args:
+            *callbacks (Callable[[StageMetrics], None]) - Functions called at the end of each stage
+            sample_interval (float) - Seconds between two samples of the resident memory
+
+        """
+        self.callbacks = list(callbacks)
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._running = set()
+        self._sampler = None
+
+    def __getstate__(self):
+        """Retrieve the state to be pickled, without the memory sampler."""
+        return dict(callbacks=self.callbacks, sample_interval=self.sample_interval)
+
+    def __setstate__(self, state):
+        """Restore a pickled state."""
+        self.__init__(*state['callbacks'], sample_interval=state['sample_interval'])
+
+    def add_callback(self, callback):
+        """Register a function called at the end of each stage."""
+        self.callbacks.append(callback)
+
+    @property
+    def enabled(self):
+        """Whether there is any callback to report."""
+        return bool(self.callbacks)
+
+    @contextmanager
+    def stage(self, name, file=None):
+        """Measure a stage of pipeline.
+
+        The `StageMetrics` is given to the block, which may fill the rows and bytes read.
+        The callbacks are called only when the stage succeeds.
+        """
+        metrics = StageMetrics(name, file)
+        start = time.perf_counter()
+
+        self._start(metrics)
+
+        try:
+            yield metrics
+        finally:
+            self._stop(metrics)
+
+        self._report(metrics, start)
+
+    def timed_iter(self, name, iterable, file=None, rows=len, position=None):
+        """Iterate over `iterable`, measuring the time to produce each item as a stage.
+
+        Args:
+            name (str) - The stage name
+            iterable (Iterable) - The items produced by stage
+            file (str) - The file being processed, if any
+            rows (Callable[[object], int]) - Function which counts the samples of an item
+            position (Callable[[], int]) - Function which retrieves the bytes read from file so far.
+                The bytes read by each item are the difference of positions.
+
+        """
+        iterator = iter(iterable)
+
+        while True:
+            metrics = StageMetrics(name, file)
+            start = time.perf_counter()
+            offset = position() if self.callbacks and position is not None else None
+
+            self._start(metrics)
+
+            try:
+                item = next(iterator, _END)
+            finally:
+                self._stop(metrics)
+
+            if item is _END:
+                return
+
+            if self.callbacks:
+                metrics.rows = rows(item)
+
+                if offset is not None:
+                    metrics.bytes_read = position() - offset
+
+            self._report(metrics, start)
+
+            yield item
+
+    def _start(self, metrics):
+        """Start sampling the peak memory of a stage."""
+        if not self.callbacks:
+            return
+
+        metrics.peak_memory = get_memory()
+
+        if metrics.peak_memory is None:
+            return
+
+        with self._lock:
+            self._running.add(metrics)
+
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='sample-db-utils-metrics', daemon=True)
+                self._sampler.start()
+
+    def _stop(self, metrics):
+        """Stop sampling the peak memory of a stage, with a last sample."""
+        with self._lock:
+            if metrics not in self._running:
+                return
+
+            self._running.discard(metrics)
+
+        memory = get_memory()
+
+        if memory is not None:
+            metrics.peak_memory = max(metrics.peak_memory, memory)
+
+    def _sample(self):
+        """Sample the resident memory for the running stages, until no stage runs."""
+        while True:
+            time.sleep(self.sample_interval)
+
+            memory = get_memory()
+
+            with self._lock:
+                if not self._running or memory is None:
+                    self._sampler = None
+                    return
+
+                for metrics in self._running:
+                    metrics.peak_memory = max(metrics.peak_memory, memory)
+
+    def _report(self, metrics, start):
+        if not self.callbacks:
+            return
+
+        metrics.wall_time = time.perf_counter() - start
+
+        for callback in self.callbacks:
+            callback(metrics)
+
+
+class JSONLinesExporter:
+    """Metrics callback which writes each `StageMetrics` as a JSON line.
+
+    It is safe to use from several threads.
+    """
+
+    def __init__(self, output):
+        """Init method.
+
+        Args:
+            output (str|io.TextIOBase) - The file path, which is appended, or a text stream
+
+        """
+        self.output = output
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics):
+        """Write the metrics."""
+        line = json.dumps(metrics.to_dict()) + '\n'
+
+        with self._lock:
+            if isinstance(self.output, (str, os.PathLike)):
+                with open(self.output, 'a') as stream:
+                    stream.write(line)
+            else:
+                self.output.write(line)
@@ -0,0 +1,124 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the registry of drivers, which are imported on first use."""
+
+import importlib
+import threading
+
+
+def iter_entry_points(group):
+    """Retrieve the entry points of a group from the installed packages."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python 3.7
+        import pkg_resources
+
+        return list(pkg_resources.iter_entry_points(group))
+
+    entry_points = entry_points()
+
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+
+    return list(entry_points.get(group, ()))
+
+
+def load_object(reference):
+    """Import the object of a reference as ``module:attribute``."""
+    module_name, _, attribute = reference.partition(':')
+
+    module = importlib.import_module(module_name)
+
+    for name in attribute.split('.'):
+        module = getattr(module, name)
+
+    return module
+
+
+class DriverRegistry:
+    """Mapping of names to driver classes, which imports each driver only when it is retrieved.
+
+    The drivers are registered as classes or as references ``module:Class``.
+    When `group` is given, the drivers of external packages are read from the
+    entry points of group, such::
+
+        entry_points={
+            'sample_db_utils.drivers': [
+                'MyDriver = my_package.drivers:MyDriver',
+            ],
+        }
+
+    The drivers registered by `DriverRegistry.add` take precedence over the entry points.
+    """
+
+    def __init__(self, drivers=None, group=None):
+        """Init method.
+
+        Args:
+            drivers (dict) - The built-in drivers as classes or references ``module:Class``
+            group (str) - The entry point group of external drivers
+
+        """
+        self.group = group
+        self._drivers = dict(drivers or dict())
+        self._lock = threading.Lock()
+        self._entry_points_loaded = group is None
+
+    def add(self, name, driver):
+        """Register a driver class or a reference ``module:Class``."""
+        with self._lock:
+            self._drivers[name] = driver
+
+    def get(self, name):
+        """Retrieve a driver class, importing it on first use.
+
+        Raises:
+            KeyError - When the driver is not registered
+
+        """
+        self._load_entry_points()
+
+        with self._lock:
+            driver = self._drivers[name]
+
+        if isinstance(driver, type):
+            return driver
+
+        driver = driver.load() if hasattr(driver, 'load') else load_object(driver)
+
+        with self._lock:
+            self._drivers[name] = driver
+
+        return driver
+
+    def names(self):
+        """Retrieve the names of registered drivers, without importing them."""
+        self._load_entry_points()
+
+        with self._lock:
+            return list(self._drivers)
+
+    def __contains__(self, name):
+        """Whether a driver is registered."""
+        return name in self.names()
+
+    def __getitem__(self, name):
+        """Retrieve a driver class (See `DriverRegistry.get`)."""
+        return self.get(name)
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+
+        entry_points = iter_entry_points(self.group)
+
+        with self._lock:
+            for entry_point in entry_points:
+                self._drivers.setdefault(entry_point.name, entry_point)
+
+            self._entry_points_loaded = True
@@ -0,0 +1,491 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the storagers which write the loaded samples into database."""
+
+import io
+import logging
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from uuid import uuid4
+
+from sample_db_utils.core.dataset import DataSet
+from sample_db_utils.core.utils import run_in_executor
+
+SAMPLE_COLUMNS = ('class_id', 'start_date', 'end_date', 'collection_date', 'user_id', 'location')
+"""The columns written when the dataset table does not describe its columns."""
+
+
+def quote_identifier(name):
+    """Quote a PostgreSQL identifier."""
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class CopyStorager:
+    """Storager which writes samples into the dataset table using PostgreSQL ``COPY``.
+
+    The samples are sent as CSV batches, with the ``location`` as
+    hex encoded EWKB, which PostGIS reads without any function call.
+
+    All the `CopyStorager.store_data` calls made inside a ``with`` block
+    run in a single transaction, which is committed at the end of block
+    or rolled back on error::
+
+        with storager:
+            driver.load_and_store(dataset_table)
+
+    Outside a ``with`` block, each call runs in its own transaction.
+
+    With `workers`, the batches are split across as many connections of the
+    `engine` pool, which send them concurrently. The store stays all-or-nothing:
+
+    - By default, the workers write into an ``UNLOGGED`` staging table, which is
+      created by the first worker connection in the first schema of the
+      ``search_path``. At the end, the samples are moved into the dataset table
+      by a single transaction, which also drops the staging table. On error, the
+      staging table is dropped once the worker connections are released and the
+      dataset table is not changed. A process killed in the middle may leave a staging
+      table named ``sample_db_utils_staging_*``, which can be dropped.
+    - With `two_phase`, the workers write into the dataset table and their
+      transactions are committed with PostgreSQL two-phase commit. It avoids the
+      copy of staging table, but requires ``max_prepared_transactions`` of at
+      least `workers`. The prepared transactions whose commit fails are committed
+      again through a new connection (``tpc_recover``).
+
+    The `engine` may also be a ``sqlalchemy.ext.asyncio.AsyncEngine`` using
+    psycopg 3, which is used by `CopyStorager.astore_data`.
+    """
+
+    columnar = True
+    """Receive the `DataSet` from `Driver.store` instead of a list of dict."""
+
+    def __init__(self, engine, classification_system_id=None, batch_size=50000, workers=1, two_phase=False):
+        """Init method.
+
+        Args:
+            engine (sqlalchemy.engine.Engine|sqlalchemy.ext.asyncio.AsyncEngine) - The database engine,
+                using psycopg2 or psycopg
+            classification_system_id (int) - The land use coverage classification system of samples
+            batch_size (int) - Maximum number of samples sent by each ``COPY``
+            workers (int) - Number of connections which send the batches concurrently.
+                The `engine` pool must allow as many connections, which are the only ones
+                held at once.
+            two_phase (bool) - Commit the connections with two-phase commit instead of using a staging table
+
+        """
+        self.engine = engine
+        self.classification_system_id = classification_system_id
+        self.batch_size = batch_size
+        self.workers = workers
+        self.two_phase = two_phase
+        self._connections = None
+        self._gtrid = None
+        self._staging_tables = dict()
+
+    @property
+    def in_transaction(self):
+        """Whether the `CopyStorager.store_data` calls are inside a ``with`` block transaction."""
+        return self._connections is not None
+
+    @property
+    def uses_staging(self):
+        """Whether the samples are written into a staging table (See `CopyStorager`)."""
+        return self.workers > 1 and not self.two_phase
+
+    def __enter__(self):
+        """Open the connections of workers and start their transactions."""
+        if self._connections is not None:
+            raise RuntimeError('The storager transaction is already open')
+
+        connections = []
+
+        try:
+            for _ in range(max(self.workers, 1)):
+                connections.append(self.engine.raw_connection())
+
+            if self.two_phase:
+                self._gtrid = f'sample_db_utils-{uuid4()}'
+
+                for shard, connection in enumerate(connections):
+                    connection.tpc_begin(connection.xid(0, self._gtrid, str(shard)))
+        except Exception:
+            for connection in connections:
+                connection.close()
+
+            raise
+
+        self._connections = connections
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Commit the transactions or roll them back on error."""
+        connections, self._connections = self._connections, None
+
+        try:
+            if exc_type is None:
+                self._commit(connections)
+            else:
+                self._rollback(connections)
+        finally:
+            for connection in connections:
+                connection.close()
+
+            self._gtrid = None
+
+            # Dropped through a new connection, once the pool has room
+            self._drop_staging_tables()
+
+    def _commit(self, connections):
+        if self.two_phase:
+            return self._commit_two_phase(connections)
+
+        if not self._staging_tables:
+            for connection in connections:
+                connection.commit()
+
+            return
+
+        try:
+            # The staged samples of the other workers become visible to the first connection
+            for connection in connections[1:]:
+                connection.commit()
+
+            cursor = connections[0].cursor()
+
+            try:
+                for (table_name, columns), staging_table in self._staging_tables.items():
+                    names = ', '.join(quote_identifier(column) for column in columns)
+
+                    cursor.execute(f'INSERT INTO {table_name} ({names}) SELECT {names} FROM {staging_table}')
+                    cursor.execute(f'DROP TABLE {staging_table}')
+            finally:
+                cursor.close()
+
+            connections[0].commit()
+        except Exception:
+            self._rollback(connections)
+            raise
+
+        self._staging_tables.clear()
+
+    def _commit_two_phase(self, connections):
+        try:
+            for connection in connections:
+                connection.tpc_prepare()
+        except Exception:
+            self._rollback(connections)
+            raise
+
+        # Every transaction is prepared, so all of them must be committed
+        failed = False
+
+        for connection in connections:
+            try:
+                connection.tpc_commit()
+            except Exception:
+                failed = True
+
+        if failed:
+            self._resolve_prepared(commit=True)
+
+    def _rollback(self, connections):
+        failed = False
+
+        # Roll back every connection, even when one of them fails
+        for connection in connections:
+            try:
+                if self.two_phase:
+                    connection.tpc_rollback()
+                else:
+                    connection.rollback()
+            except Exception as e:
+                logging.warning('Could not roll back the storager connection: {}'.format(e))
+                failed = True
+
+        if failed and self.two_phase:
+            self._resolve_prepared(commit=False)
+
+    def _resolve_prepared(self, commit):
+        """Commit or roll back through a new connection the prepared transactions left by the workers."""
+        try:
+            connection = self.engine.raw_connection()
+
+            try:
+                for xid in connection.tpc_recover():
+                    if xid.gtrid != self._gtrid:
+                        continue
+
+                    if commit:
+                        connection.tpc_commit(xid)
+                    else:
+                        connection.tpc_rollback(xid)
+            finally:
+                connection.close()
+        except Exception as e:
+            action = 'COMMIT PREPARED' if commit else 'ROLLBACK PREPARED'
+
+            raise RuntimeError(f'The prepared transactions {self._gtrid} could not be resolved. '
+                               f'Use {action} for each one listed by pg_prepared_xacts.') from e
+
+    @staticmethod
+    def _execute(connection, sql):
+        """Run a statement and commit it."""
+        cursor = connection.cursor()
+
+        try:
+            cursor.execute(sql)
+        finally:
+            cursor.close()
+
+        connection.commit()
+
+    def _get_staging_table(self, table_name, columns):
+        key = (table_name, tuple(columns))
+
+        if key not in self._staging_tables:
+            staging_table = quote_identifier(f'sample_db_utils_staging_{uuid4().hex}')
+            names = ', '.join(quote_identifier(column) for column in columns)
+
+            # Committed at once, so every worker connection can write into it. The first
+            # connection only writes into staging tables, so its commit does not change the dataset.
+            self._execute(self._connections[0],
+                          f'CREATE UNLOGGED TABLE {staging_table} AS SELECT {names} FROM {table_name} WITH NO DATA')
+
+            self._staging_tables[key] = staging_table
+
+        return self._staging_tables[key]
+
+    def _drop_staging_tables(self):
+        staging_tables, self._staging_tables = self._staging_tables, dict()
+
+        if not staging_tables:
+            return
+
+        try:
+            connection = self.engine.raw_connection()
+        except Exception as e:
+            logging.warning('Could not drop the staging tables {}: {}'.format(', '.join(staging_tables.values()), e))
+            return
+
+        try:
+            for staging_table in staging_tables.values():
+                try:
+                    self._execute(connection, f'DROP TABLE IF EXISTS {staging_table}')
+                except Exception as e:
+                    connection.rollback()
+                    logging.warning('Could not drop the staging table {}: {}'.format(staging_table, e))
+        finally:
+            connection.close()
+
+    def store_data(self, data_sets, dataset_table):
+        """Write the samples into the dataset table.
+
+        Args:
+            data_sets (DataSet) - The samples
+            dataset_table (sqlalchemy.Table|str) - The dataset table or its name, optionally qualified by schema
+
+        """
+        if not isinstance(data_sets, DataSet):
+            raise TypeError('CopyStorager only supports DataSet')
+
+        if self._connections is None:
+            with self:
+                self._copy(data_sets, dataset_table)
+        else:
+            self._copy(data_sets, dataset_table)
+
+    def _copy(self, data_sets, dataset_table):
+        if len(self._connections) == 1:
+            return self.copy(self._connections[0], data_sets, dataset_table)
+
+        if not self.uses_staging:
+            return self.copy_sharded(self._connections, data_sets, dataset_table)
+
+        table_name, columns = self.get_table(dataset_table, data_sets.columns)
+        staging_table = self._get_staging_table(table_name, columns)
+
+        return self._copy_sharded(self._connections, self.format_copy_sql(staging_table, columns), columns, data_sets)
+
+    async def astore_data(self, data_sets, dataset_table, executor=None):
+        """Write the samples into the dataset table without blocking the event loop.
+
+        With an ``AsyncEngine``, the samples are sent by its asynchronous
+        connection in their own transaction. Otherwise, `CopyStorager.store_data`
+        runs in `executor`.
+        """
+        if not hasattr(self.engine, 'sync_engine'):
+            return await run_in_executor(executor, self.store_data, data_sets, dataset_table)
+
+        if not isinstance(data_sets, DataSet):
+            raise TypeError('CopyStorager only supports DataSet')
+
+        async with self.engine.begin() as connection:
+            raw_connection = await connection.get_raw_connection()
+
+            await self.acopy(raw_connection.driver_connection, data_sets, dataset_table, executor=executor)
+
+    async def acopy(self, connection, data_sets, dataset_table, executor=None):
+        """Send the samples with ``COPY`` using a psycopg 3 ``AsyncConnection``, without committing it.
+
+        The CSV batches are built in `executor`.
+
+        Returns:
+            int - The number of samples written
+
+        """
+        sql, columns = self.get_copy_sql(dataset_table, data_sets.columns)
+
+        total = 0
+
+        async with connection.cursor() as cursor:
+            for batch in self.iter_batches(data_sets):
+                buffer = await run_in_executor(executor, self.build_buffer, batch, columns)
+
+                async with cursor.copy(sql) as copy:
+                    await copy.write(buffer.getvalue())
+
+                total += len(batch)
+
+        return total
+
+    def copy(self, connection, data_sets, dataset_table):
+        """Send the samples with ``COPY`` using a DB-API connection, without committing it.
+
+        Returns:
+            int - The number of samples written
+
+        """
+        sql, columns = self.get_copy_sql(dataset_table, data_sets.columns)
+
+        return self._copy_batches(connection, sql, columns, self.iter_batches(data_sets))
+
+    def copy_sharded(self, connections, data_sets, dataset_table):
+        """Send the samples with ``COPY`` using several DB-API connections at once, without committing them.
+
+        The batches are dealt round-robin to the connections, each one used by its own thread.
+        When a connection fails, the others stop at the next batch.
+
+        Returns:
+            int - The number of samples written
+
+        """
+        sql, columns = self.get_copy_sql(dataset_table, data_sets.columns)
+
+        return self._copy_sharded(connections, sql, columns, data_sets)
+
+    def _copy_sharded(self, connections, sql, columns, data_sets):
+        shards = [[] for _ in connections]
+
+        for index, batch in enumerate(self.iter_batches(data_sets)):
+            shards[index % len(shards)].append(batch)
+
+        stop = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+            futures = [
+                executor.submit(self._copy_batches, connection, sql, columns, batches, stop)
+                for connection, batches in zip(connections, shards) if batches
+            ]
+
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+
+            if any(future.exception() is not None for future in done):
+                stop.set()
+
+        return sum(future.result() for future in futures)
+
+    def iter_batches(self, data_sets):
+        """Iterate over the samples in data frames of at most `batch_size` rows."""
+        for frame in data_sets.iter_frames():
+            for start in range(0, len(frame), self.batch_size):
+                yield frame.iloc[start:start + self.batch_size]
+
+    def _copy_batches(self, connection, sql, columns, batches, stop=None):
+        total = 0
+
+        cursor = connection.cursor()
+
+        try:
+            for batch in batches:
+                if stop is not None and stop.is_set():
+                    break
+
+                _copy_expert(cursor, sql, self.build_buffer(batch, columns))
+
+                total += len(batch)
+        finally:
+            cursor.close()
+
+        return total
+
+    @classmethod
+    def get_copy_sql(cls, dataset_table, columns):
+        """Retrieve the ``COPY`` statement and the columns to write."""
+        table_name, columns = cls.get_table(dataset_table, columns)
+
+        return cls.format_copy_sql(table_name, columns), columns
+
+    @staticmethod
+    def format_copy_sql(table_name, columns):
+        """Build the ``COPY`` statement of a quoted table name."""
+        return 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            table_name, ', '.join(quote_identifier(column) for column in columns)
+        )
+
+    @staticmethod
+    def get_table(dataset_table, columns):
+        """Retrieve the quoted table name and the columns to write.
+
+        Args:
+            dataset_table (sqlalchemy.Table|str) - The dataset table
+            columns (list of str) - The columns of samples
+
+        Returns:
+            tuple (str, list of str)
+
+        """
+        if isinstance(dataset_table, str):
+            names = dataset_table.split('.')
+            table_columns = SAMPLE_COLUMNS
+        else:
+            names = [dataset_table.schema, dataset_table.name] if dataset_table.schema else [dataset_table.name]
+            table_columns = [column.name for column in dataset_table.columns]
+
+        columns = [column for column in columns if column in table_columns and column != 'id']
+
+        return '.'.join(quote_identifier(name) for name in names), columns
+
+    @staticmethod
+    def build_buffer(frame, columns):
+        """Build the CSV read by ``COPY`` for a batch of samples.
+
+        Missing values are written as empty fields, which are NULL for ``COPY``.
+        """
+        frame = frame.reindex(columns=columns)
+
+        if 'location' in columns:
+            frame = frame.assign(location=frame['location'].map(bytes.hex, na_action='ignore'))
+
+        buffer = io.StringIO()
+
+        frame.to_csv(buffer, header=False, index=False)
+
+        buffer.seek(0)
+
+        return buffer
+
+
+def _copy_expert(cursor, sql, buffer):
+    # psycopg2
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, buffer)
+        return
+
+    # psycopg 3
+    with cursor.copy(sql) as copy:
+        copy.write(buffer.getvalue())
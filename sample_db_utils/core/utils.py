@@ -7,15 +7,47 @@
 #
 """This file contains code utilities of Brazil Data Cubes sampledb."""
 
+import asyncio
+import contextvars
+import datetime
+import importlib
 import os
-from datetime import datetime
+import struct
+import sys
+import threading
+import types
+from collections import OrderedDict
+from functools import lru_cache, partial
 from io import IOBase
 from tempfile import SpooledTemporaryFile
 from zipfile import ZipFile
 
-import osgeo
-from osgeo import osr
-from werkzeug.datastructures import FileStorage
+import numpy
+import pandas as pd
+import shapely
+
+
+class LazyModule(types.ModuleType):
+    """Module which is only imported on first attribute access.
+
+    It keeps the heavy optional dependencies, such GDAL, out of the
+    processes which do not use them::
+
+        gdal = LazyModule('osgeo.gdal')
+    """
+
+    def __getattr__(self, name):
+        """Import the module and retrieve its attribute."""
+        module = importlib.import_module(self.__name__)
+
+        self.__dict__.update(module.__dict__)
+
+        return getattr(module, name)
+
+
+osgeo = LazyModule('osgeo')
+osr = LazyModule('osgeo.osr')
+pyproj = LazyModule('pyproj')
 
 
 def validate_mappings(mappings):
@@ -27,7 +59,9 @@ def validate_mappings(mappings):
     - geom : Geometry field.
     - latitude: Latitude field (when geom is not provided)
     - longitude: Longitude field (when geom is not provided)
-    - class_name: Sample class. Default is "label"
+    - class_id: Sample class identifier. Default is "class_id"
+    - class_name: Sample class name, which is mapped to the class identifier
+      of classification system. When given, `class_id` is not used.
     - start_date: Start date field. Default is "start_date"
     - end_date: End date field. Default is "end_date"
     - collection_date: End date field. Default is "end_date"
@@ -49,7 +83,7 @@ def validate_mappings(mappings):
     if not mappings:
         raise TypeError('Invalid mappings')
 
-    if not mappings.get('class_id'):
+    if not mappings.get('class_id') and not mappings.get('class_name'):
         mappings['class_id'] = 'class_id'
 
     if not mappings.get('geom'):
@@ -61,6 +95,111 @@ def validate_mappings(mappings):
     set_default_value_for('collection_date', mappings)
 
 
+class LRUCache:
+    """Thread safe mapping with bounded size, which discards the least recently used entries."""
+
+    def __init__(self, maxsize=128):
+        """Init method.
+
+        Args:
+            maxsize (int) - Maximum number of entries kept.
+
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Retrieve the value of key, creating it with `factory()` when missing."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # Build outside the lock, since it may be expensive
+        value = factory()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        """Retrieve the number of entries."""
+        return len(self._entries)
+
+
+_transformations = LRUCache(maxsize=64)
+
+_EWKB_SRID_FLAG = 0x20000000
+
+# The geometry type without the EWKB flags of Z, M and SRID
+_ISO_TYPE_MASK = 0x0FFFFFFF
+
+
+def _make_spatial_reference(srid):
+    srs = osr.SpatialReference()
+
+    if isinstance(srid, int):
+        srs.ImportFromEPSG(srid)
+    else:
+        srs.ImportFromProj4(srid)
+
+    if int(osgeo.__version__[0]) >= 3:
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    return srs
+
+
+def get_transformation(source_srid, target_srid):
+    """Retrieve a cached coordinate transformation between two SRID.
+
+    The transformations are cached by (source, target) and by thread,
+    since GDAL transformations must not be shared between threads.
+
+    Args:
+        source_srid (int|str): Input SRID or PROJ.4 definition
+        target_srid (int|str): Target SRID or PROJ.4 definition
+
+    Returns:
+        osr.CoordinateTransformation
+
+    """
+    def factory():
+        return osr.CoordinateTransformation(_make_spatial_reference(source_srid),
+                                            _make_spatial_reference(target_srid))
+
+    return _transformations.get((source_srid, target_srid, threading.get_ident()), factory)
+
+
+def get_transformer(source_srid, target_srid):
+    """Retrieve a cached ``pyproj.Transformer`` between two SRID, using x/y (lon/lat) order.
+
+    Args:
+        source_srid (int|str): Input SRID or PROJ.4 definition
+        target_srid (int|str): Target SRID or PROJ.4 definition
+
+    Returns:
+        pyproj.Transformer
+
+    """
+    def factory():
+        return pyproj.Transformer.from_crs(pyproj.CRS.from_user_input(source_srid),
+                                           pyproj.CRS.from_user_input(target_srid),
+                                           always_xy=True)
+
+    return _transformations.get(('pyproj', source_srid, target_srid, threading.get_ident()), factory)
+
+
 def reproject(geom, source_srid, target_srid):
     """Reproject a geometry to srid provided.
 
@@ -72,26 +211,116 @@ def reproject(geom, source_srid, target_srid):
         target_srid (int): Target SRID
 
     """
-    source = osr.SpatialReference()
+    geom.Transform(get_transformation(source_srid, target_srid))
 
-    if isinstance(source_srid, int):
-        source.ImportFromEPSG(source_srid)
-    else:
-        source.ImportFromProj4(source_srid)
 
-    target = osr.SpatialReference()
+def reproject_geometries(geometries, source_srid, target_srid):
+    """Reproject all the geometries of a layer using a single transformation.
 
-    if isinstance(target_srid, int):
-        target.ImportFromEPSG(target_srid)
-    else:
-        target.ImportFromProj4(target_srid)
+    Args:
+        geometries (Iterable[ogr.Geometry]): Geometries, transformed in place
+        source_srid (int|str): Input SRID
+        target_srid (int|str): Target SRID
 
-    if int(osgeo.__version__[0]) >= 3:
-        source.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
-        target.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    Returns:
+        list of ogr.Geometry - The transformed geometries
+
+    """
+    transformation = get_transformation(source_srid, target_srid)
+
+    result = []
+
+    for geom in geometries:
+        geom.Transform(transformation)
+        result.append(geom)
+
+    return result
+
+
+def reproject_coordinates(x, y, source_srid, target_srid):
+    """Reproject coordinate arrays at once.
+
+    Args:
+        x (numpy.ndarray): X coordinates (longitude)
+        y (numpy.ndarray): Y coordinates (latitude)
+        source_srid (int|str): Input SRID
+        target_srid (int|str): Target SRID
+
+    Returns:
+        tuple of numpy.ndarray - The transformed (x, y)
+
+    """
+    if source_srid == target_srid:
+        return x, y
 
-    transform = osr.CoordinateTransformation(source, target)
-    geom.Transform(transform)
+    return get_transformer(source_srid, target_srid).transform(x, y)
+
+
+def reproject_shapes(geometries, source_srid, target_srid):
+    """Reproject an array of shapely geometries at once.
+
+    Args:
+        geometries (numpy.ndarray): Shapely geometries
+        source_srid (int|str): Input SRID
+        target_srid (int|str): Target SRID
+
+    Returns:
+        numpy.ndarray - The transformed geometries
+
+    """
+    if source_srid == target_srid:
+        return geometries
+
+    transformer = get_transformer(source_srid, target_srid)
+
+    def transform(coordinates):
+        return numpy.column_stack(transformer.transform(coordinates[:, 0], coordinates[:, 1]))
+
+    return shapely.transform(geometries, transform)
+
+
+def to_ewkb(geometries, srid=4326):
+    """Encode shapely geometries as EWKB, the PostGIS binary format which includes the SRID.
+
+    Args:
+        geometries (numpy.ndarray): Shapely geometries
+        srid (int): The SRID of geometries
+
+    Returns:
+        numpy.ndarray - The EWKB of each geometry as bytes
+
+    """
+    return shapely.to_wkb(shapely.set_srid(geometries, srid), include_srid=True)
+
+
+def wkb_to_ewkb(wkb, srid=4326):
+    """Add the SRID into a WKB geometry header, without parsing the geometry.
+
+    The WKB exported by OGR (``ogr.Geometry.ExportToWkb``) uses the same
+    flags as EWKB for 2.5D geometries, so only the SRID is missing. The
+    measured geometries (M and ZM) are written with the ISO type codes,
+    such 2001 for POINT M, which are encoded again with shapely.
+
+    Args:
+        wkb (bytes): Geometry as WKB
+        srid (int): The SRID of geometry
+
+    Returns:
+        bytes - The geometry as EWKB
+
+    """
+    wkb = bytes(wkb)
+
+    byte_order = '<' if wkb[0] == 1 else '>'
+
+    geometry_type, = struct.unpack_from(f'{byte_order}I', wkb, 1)
+
+    if geometry_type & _ISO_TYPE_MASK > 1000:
+        return to_ewkb(shapely.from_wkb(wkb), srid=srid)
+
+    header = struct.pack(f'{byte_order}II', geometry_type | _EWKB_SRID_FLAG, srid)
+
+    return wkb[:1] + header + wkb[5:]
 
 
 def unzip(stream, destination):
@@ -113,18 +342,106 @@ def unzip(stream, destination):
 
 def is_stream(entry):
     """Return if the provided entry is readable as stream-like."""
+    # An entry can only be a FileStorage when werkzeug is already imported
+    datastructures = sys.modules.get('werkzeug.datastructures')
+
     return isinstance(entry, IOBase) or \
            isinstance(entry, SpooledTemporaryFile) or \
-           isinstance(entry, FileStorage)
+           (datastructures is not None and isinstance(entry, datastructures.FileStorage))
 
 
-def get_date_from_str(date):
-    """Build date from str."""
-    date = date.replace('/', '-')
+async def run_in_executor(executor, func, *args):
+    """Run a blocking function in an executor without blocking the event loop.
 
+    The function runs with a copy of current context, so context variables,
+    such the application context of web frameworks, are kept.
+
+    Args:
+        executor (concurrent.futures.Executor) - The executor. Use None for the default executor of loop.
+        func (Callable) - The blocking function
+        *args - The function arguments
+
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+
+    return await loop.run_in_executor(executor, partial(context.run, func, *args))
+
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y')
+"""The date formats tried by `parse_dates`, after replacing ``/`` by ``-``."""
+
+
+def parse_dates(values, formats=DATE_FORMATS, errors='ignore'):
+    """Normalize a column of dates to the format ``YYYY-MM-DD``.
+
+    Only the distinct values of column are parsed. Each format is tried
+    once for all the values which were not parsed by the previous formats.
+
+    Args:
+        values (pandas.Series|array-like) - The dates
+        formats (tuple of str) - The accepted date formats
+        errors (str) - When `ignore`, the values which do not match any format
+            are kept (with ``/`` replaced). When `coerce`, they are None.
+            When `raise`, a ValueError is raised.
+
+    Returns:
+        pandas.Series - The normalized dates as str, or None for missing values
+
+    """
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values, dtype=object)
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        dates = values.dt.strftime('%Y-%m-%d').astype(object)
+
+        return dates.where(values.notna(), None)
+
+    codes, uniques = pd.factorize(values)
+
+    if len(uniques) == 0:
+        return pd.Series(None, index=values.index, dtype=object)
+
+    text = pd.Series([
+        value.strftime('%Y-%m-%d') if isinstance(value, datetime.date) else str(value).strip().replace('/', '-')
+        for value in uniques
+    ], dtype=object)
+
+    # Parsed with strptime, which accepts the dates out of the nanosecond range, such 9999-12-31
+    dates = pd.Series(None, index=text.index, dtype=object)
+
+    for date_format in formats:
+        missing = dates.isna()
+
+        if not missing.any():
+            break
+
+        dates[missing] = [_strptime(value, date_format) for value in text[missing]]
+
+    unknown = dates.isna()
+
+    if unknown.any():
+        if errors == 'raise':
+            raise ValueError(f'Invalid dates: {", ".join(text[unknown].head(10))}')
+
+        dates[unknown] = None if errors == 'coerce' else text[unknown]
+
+    dates = dates.to_numpy()
+
+    return pd.Series(numpy.where(codes >= 0, dates[codes], None), index=values.index, dtype=object)
+
+
+def _strptime(value, date_format):
     try:
-        date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
+        return datetime.datetime.strptime(value, date_format).date().isoformat()
     except ValueError:
-        date = datetime.strptime(date, '%d-%m-%Y').strftime('%Y-%m-%d')
+        return None
+
 
-    return date
\ No newline at end of file
+@lru_cache(maxsize=4096)
+def get_date_from_str(date, errors='raise'):
+    """Build date from str.
+
+    It is the scalar version of `parse_dates`, with the results memoized.
+    """
+    return parse_dates([date], errors=errors).iloc[0]
@@ -0,0 +1,108 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""This file contains the report of the validation of samples without loading them."""
+
+from collections import Counter
+
+import numpy
+
+from sample_db_utils.core.utils import reproject_coordinates
+
+
+def count_out_of_bounds(x, y, srid=4326):
+    """Count the coordinates which are not valid longitudes and latitudes once in EPSG:4326.
+
+    Args:
+        x (array-like) - The x coordinates (longitudes)
+        y (array-like) - The y coordinates (latitudes)
+        srid (int|str) - The SRID or PROJ.4 definition of coordinates
+
+    Returns:
+        int - The number of invalid coordinates, including the missing ones
+
+    """
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+
+    if srid != 4326:
+        x, y = reproject_coordinates(x, y, srid, 4326)
+
+    with numpy.errstate(invalid='ignore'):
+        valid = (numpy.abs(x) <= 180) & (numpy.abs(y) <= 90)
+
+    return int((~valid).sum())
+
+
+class ValidationReport:
+    """Summary of the validation of samples (See `Driver.validate`).
+
+    Attributes:
+        files (int) - The number of files checked
+        rows (int) - The number of samples checked
+        classes (set) - The distinct classes of samples
+        missing_classes (list) - The classes which do not exist in the classification system
+        invalid_dates (collections.Counter) - The number of invalid dates by field
+        out_of_bounds (int) - The number of samples with invalid coordinates
+        missing_geometries (int) - The number of samples without geometry
+        errors (list of tuple) - The first `max_errors` errors as (file, message)
+        error_count (int) - The number of errors, including the ones not kept
+
+    """
+
+    def __init__(self, max_errors=100):
+        """Init method.
+
+        Args:
+            max_errors (int) - Maximum number of error messages kept
+
+        """
+        self.max_errors = max_errors
+        self.files = 0
+        self.rows = 0
+        self.classes = set()
+        self.missing_classes = []
+        self.invalid_dates = Counter()
+        self.out_of_bounds = 0
+        self.missing_geometries = 0
+        self.errors = []
+        self.error_count = 0
+        self._messages = set()
+
+    @property
+    def valid(self):
+        """Whether the samples can be loaded."""
+        return not (self.error_count or self.missing_classes or sum(self.invalid_dates.values()) or
+                    self.out_of_bounds or self.missing_geometries)
+
+    def add_error(self, file, message):
+        """Record an error of a file. The errors repeated by several chunks of a file are recorded once."""
+        error = (None if file is None else str(getattr(file, 'filename', None) or file), message)
+
+        if error in self._messages:
+            return
+
+        self._messages.add(error)
+        self.error_count += 1
+
+        if len(self.errors) < self.max_errors:
+            self.errors.append(error)
+
+    def to_dict(self):
+        """Retrieve the report as a dict, which can be serialized as JSON."""
+        return dict(
+            valid=self.valid,
+            files=self.files,
+            rows=self.rows,
+            classes=sorted(self.classes, key=str),
+            missing_classes=list(self.missing_classes),
+            invalid_dates=dict(self.invalid_dates),
+            out_of_bounds=self.out_of_bounds,
+            missing_geometries=self.missing_geometries,
+            errors=[dict(file=file, message=message) for file, message in self.errors],
+            error_count=self.error_count,
+        )
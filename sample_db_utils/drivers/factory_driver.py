@@ -8,23 +8,27 @@
 
 """Sample DB Utils Drives Factory."""
 
-from .bdc import BDC
-from .hugo import Hugo
-from .hugo_tese import HugoTese
-from .inSitu import InSitu
+from ..core.registry import DriverRegistry
 
 
 class DriversFactory:
-    """Factory for Drives."""
+    """Factory for Drives.
+
+    External drivers are read from the entry point group ``sample_db_utils.drivers``.
+    """
+
+    drivers = DriverRegistry({
+        'BDC': 'sample_db_utils.drivers.bdc:BDC',
+        'Hugo': 'sample_db_utils.drivers.hugo:Hugo',
+        'HugoTese': 'sample_db_utils.drivers.hugo_tese:HugoTese',
+        'InSitu': 'sample_db_utils.drivers.inSitu:InSitu',
+    }, group='sample_db_utils.drivers')
 
     @staticmethod
     def make(driverType, entries, storager, **kwargs):
         """Make Factory method for creates datasource."""
-        factorys = ["Cerrado", "VMaus", "Canasat", "Lapig", "Fototeca" , "Embrapa", "InSitu",  "BDC",
-                    "Hugo", "HugoTese"]
-
-        assert driverType in factorys
+        assert driverType in DriversFactory.drivers
 
-        driver = eval(driverType)(entries, storager, **kwargs)
+        driver = DriversFactory.drivers.get(driverType)(entries, storager, **kwargs)
 
-        return driver
\ No newline at end of file
+        return driver
@@ -28,16 +28,17 @@ class InSitu(CSV):
 
         super(InSitu, self).__init__(entries, mappings, storager, **kwargs)
 
-    def load_data_sets(self):
-        """Load data sets in memory using database format.
+    def get_files(self):
+        """Get files.
 
-        Calls `R` script to generate CSV sample data set. After that,
-        process the `CSV` files to the storager handler.
+        Calls `R` script to generate CSV sample data set, so every
+        entry point (`load_data_sets`, `load_and_store`, `validate`)
+        reads the generated `CSV` files.
         """
         # Read data sets (.rda) from R to CSV
         InSitu.generate_data_sets(self.entries)
 
-        return super().load_data_sets()
+        return super().get_files()
 
     @classmethod
     def generate_data_sets(cls, entries):
@@ -7,41 +7,47 @@
 #
 """Sample DB Utils Factory."""
 
-from sample_db_utils.core.driver import CSV, Shapefile
+from sample_db_utils.core.registry import DriverRegistry
 
 
 class DriverFactory:
     """Defines a list of loaded drivers responsible to read samples dataset.
 
     A driver consists in an implementation of sample_db_utils.core.driver.Driver.
-    By default, we support both CSV and Shapefile samples.
+    By default, we support CSV, Shapefile, GeoPackage, FlatGeobuf and GeoParquet samples.
     These drivers are attached to the HTTP content type.
-    TODO: Read external drivers using entrypoints pkg_resources
+    External drivers are read from the entry point group ``sample_db_utils.content_types``,
+    named by content type. The drivers are imported only when retrieved.
     """
 
-    drivers = {
-        'application/json': CSV,
-        'text/csv': CSV,
-        'application/vnd.ms-excel': CSV,
-        'application/zip': Shapefile,
-        'application/x-zip-compressed': Shapefile
-    }
+    drivers = DriverRegistry({
+        'application/json': 'sample_db_utils.core.driver:CSV',
+        'application/x-ndjson': 'sample_db_utils.core.driver:CSV',
+        'text/csv': 'sample_db_utils.core.driver:CSV',
+        'application/vnd.ms-excel': 'sample_db_utils.core.driver:CSV',
+        'application/zip': 'sample_db_utils.core.driver:Shapefile',
+        'application/x-zip-compressed': 'sample_db_utils.core.driver:Shapefile',
+        'application/geopackage+sqlite3': 'sample_db_utils.core.driver:GeoPackage',
+        'application/flatgeobuf': 'sample_db_utils.core.driver:FlatGeobuf',
+        'application/vnd.apache.parquet': 'sample_db_utils.core.driver:GeoParquet',
+        'application/x-parquet': 'sample_db_utils.core.driver:GeoParquet'
+    }, group='sample_db_utils.content_types')
 
     def add(self, driver_name, driver):
         """Add a new driver into factory for handle sample by content type.
 
         Args:
             driver_name (str): Content type of Driver.
-            driver (Driver): Driver Class handler.
+            driver (Driver|str): Driver Class handler or its reference as ``module:Class``.
 
         """
-        self.drivers[driver_name] = driver
+        self.drivers.add(driver_name, driver)
 
     def get(self, driver_name):
         """Retrieve a loaded driver from content type."""
         assert driver_name in self.drivers
 
-        return self.drivers[driver_name]
+        return self.drivers.get(driver_name)
 
 
 factory = DriverFactory()
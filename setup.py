@@ -33,9 +33,19 @@ docs_require = [
     'sphinx-copybutton',
 ]
 
+benchmarks_require = [
+    'pytest-benchmark>=3.2',
+]
+
+parquet_require = [
+    'pyarrow>=8.0',
+]
+
 extras_require = {
     'docs': docs_require,
     'tests': tests_require,
+    'benchmarks': benchmarks_require,
+    'parquet': parquet_require,
 }
 
 extras_require['all'] = [req for exts, reqs in extras_require.items() for req in reqs]
@@ -45,10 +55,11 @@ setup_requires = [
 ]
 
 install_requires = [
-    'geopandas>=0.5.0',
+    'geopandas>=0.12.0',
     'GeoAlchemy2>=0.6.2',
-    'shapely>=1.6',
+    'shapely>=2.0',
     'GDAL>=2.2',
+    'pyproj>=2.6',
     'lccs-db @ git+https://github.com/brazil-data-cube/lccs-db.git@v0.8.1',
 ]
 
@@ -0,0 +1,55 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Fixtures of sample-db-utils tests."""
+import pytest
+
+from sample_db_utils.core.classes import ClassCache
+
+
+class MemoryStorager:
+    """Storager which keeps the stored samples in memory.
+
+    Once `fail_after` batches are stored, the next one fails as a lost connection.
+    """
+
+    def __init__(self, columnar=False, classification_system_id=1, fail_after=None):
+        self.columnar = columnar
+        self.classification_system_id = classification_system_id
+        self.fail_after = fail_after
+        self.batches = []
+
+    def store_data(self, data_sets, dataset_table):
+        if self.fail_after is not None and len(self.batches) == self.fail_after:
+            raise RuntimeError('Connection lost')
+
+        self.batches.append(data_sets)
+
+
+class AsyncMemoryStorager(MemoryStorager):
+    """Storager which keeps the stored samples in memory, asynchronously."""
+
+    def __init__(self, columnar=False, classification_system_id=1):
+        super(AsyncMemoryStorager, self).__init__(columnar, classification_system_id)
+        self.executors = []
+
+    async def astore_data(self, data_sets, dataset_table, executor=None):
+        self.executors.append(executor)
+        self.batches.append(data_sets)
+
+
+@pytest.fixture
+def make_driver():
+    """Build drivers which store into a `MemoryStorager` and validate the given classes, without database."""
+    def make(driver_class, entries, mappings, classes=(1, 2), storager=None, **kwargs):
+        driver = driver_class(entries=entries, mappings=mappings,
+                              storager=MemoryStorager() if storager is None else storager, **kwargs)
+        driver.class_cache = ClassCache(loader=lambda system_id: list(classes))
+
+        return driver
+
+    return make
@@ -0,0 +1,75 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils class cache."""
+import asyncio
+
+import numpy
+
+from sample_db_utils.core.classes import ClassCache, lookup_classes
+
+
+def test_class_cache():
+    queries = []
+
+    def loader(system_id):
+        queries.append(system_id)
+        return [1, 2, 3]
+
+    cache = ClassCache(loader=loader)
+
+    assert cache.missing(1, [1, 2]) == []
+    assert cache.missing(1, [3, 4, 4]) == [4]
+    assert queries == [1]
+
+    cache.invalidate(1)
+
+    assert cache.get(1) == frozenset([1, 2, 3])
+    assert queries == [1, 1]
+
+
+def test_class_cache_ttl():
+    queries = []
+
+    def loader(system_id):
+        queries.append(system_id)
+        return [1]
+
+    cache = ClassCache(ttl=0, loader=loader)
+    cache.get(1)
+    cache.get(1)
+
+    assert queries == [1, 1]
+
+
+def test_class_cache_aget():
+    queries = []
+
+    def loader(system_id):
+        queries.append(system_id)
+        return [1, 2, 3]
+
+    cache = ClassCache(loader=loader)
+
+    async def get_concurrently():
+        return await asyncio.gather(*[cache.aget(1) for _ in range(5)])
+
+    assert asyncio.run(get_concurrently()) == [frozenset([1, 2, 3])] * 5
+    assert queries == [1]
+
+
+def test_lookup_classes():
+    class_ids, unknown = lookup_classes(['Forest', 'Water', None, 'Forest', 'Pasture'], dict(Forest=1, Water=2))
+
+    assert list(class_ids) == [1, 2, None, 1, None]
+    assert unknown == ['Pasture', None]
+
+    class_ids, unknown = lookup_classes(numpy.array([2, 1, 2]), frozenset([1, 2]))
+
+    assert class_ids.dtype == numpy.int64
+    assert list(class_ids) == [2, 1, 2]
+    assert unknown == []
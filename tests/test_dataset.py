@@ -0,0 +1,34 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils data set container."""
+import pandas as pd
+
+from sample_db_utils.core.dataset import DataSet
+
+
+def test_data_set_constants():
+    data_set = DataSet()
+    data_set.append(pd.DataFrame(dict(class_id=[1, 2])), user_id=10, start_date='2018-09-01')
+    data_set.append(pd.DataFrame(dict(class_id=[3])), user_id=10, start_date='2019-09-01')
+
+    assert len(data_set) == 3
+    assert data_set.columns == ['class_id', 'user_id', 'start_date']
+    assert data_set.to_dicts() == [
+        dict(class_id=1, user_id=10, start_date='2018-09-01'),
+        dict(class_id=2, user_id=10, start_date='2018-09-01'),
+        dict(class_id=3, user_id=10, start_date='2019-09-01'),
+    ]
+    assert list(data_set.to_frame()['start_date']) == ['2018-09-01', '2018-09-01', '2019-09-01']
+
+
+def test_data_set_skip_empty():
+    data_set = DataSet()
+    data_set.append(pd.DataFrame(dict(class_id=[])), user_id=10)
+
+    assert len(data_set) == 0
+    assert data_set.to_dicts() == []
@@ -0,0 +1,101 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils duplicated samples detection."""
+import io
+
+import numpy
+import pandas as pd
+from conftest import MemoryStorager
+
+from sample_db_utils.core.dataset import DataSet
+from sample_db_utils.core.dedupe import Deduplicator
+from sample_db_utils.core.driver import CSV
+
+
+def _make_data_set(class_ids, start_date='2018-09-01'):
+    frame = pd.DataFrame(dict(location=[b'\x01'] * len(class_ids), class_id=class_ids))
+
+    data_set = DataSet()
+    data_set.append(frame, start_date=start_date, end_date='2019-08-31')
+
+    return data_set
+
+
+def test_deduplicator_filter():
+    dedupe = Deduplicator()
+
+    first = dedupe.filter(_make_data_set([1, 2, 1]))
+    second = dedupe.filter(_make_data_set([2, 3]))
+    other_date = dedupe.filter(_make_data_set([2], start_date='2018-10-01'))
+
+    assert list(first.to_frame()['class_id']) == [1, 2]
+    assert list(second.to_frame()['class_id']) == [3]
+    assert len(other_date) == 1
+    assert dedupe.duplicates == 2
+    assert len(dedupe) == 4
+
+
+def test_deduplicator_count_only():
+    dedupe = Deduplicator(drop=False)
+
+    data_set = dedupe.filter(_make_data_set([1, 1]))
+
+    assert len(data_set) == 2
+    assert dedupe.duplicates == 1
+
+
+def test_deduplicator_spill(tmp_path):
+    with Deduplicator(max_memory_rows=100, spill_dir=str(tmp_path)) as dedupe:
+        for start in range(0, 1000, 50):
+            assert not dedupe.add(numpy.arange(start, start + 50, dtype=numpy.uint64)).any()
+
+        assert dedupe.add(numpy.array([0, 999, 1000], dtype=numpy.uint64)).tolist() == [True, True, False]
+        assert len(dedupe) == 1001
+        assert any(isinstance(run, numpy.memmap) for run in dedupe._runs)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_deduplicator_spill_merge_in_blocks(tmp_path, monkeypatch):
+    sizes = []
+    union1d = numpy.union1d
+
+    def spy(first, second):
+        sizes.append(len(first) + len(second))
+
+        return union1d(first, second)
+
+    monkeypatch.setattr(numpy, 'union1d', spy)
+
+    hashes = numpy.random.default_rng(0).permutation(numpy.arange(2000, dtype=numpy.uint64))
+
+    with Deduplicator(max_memory_rows=100, spill_dir=str(tmp_path)) as dedupe:
+        for start in range(0, 2000, 80):
+            assert not dedupe.add(hashes[start:start + 80]).any()
+
+        assert dedupe.add(hashes[:10]).all()
+        assert len(dedupe) == 2000
+        assert all(numpy.all(run[:-1] < run[1:]) for run in dedupe._runs)
+
+    assert max(sizes) <= 100
+
+
+def test_csv_load_and_store_dedupe(make_driver):
+    mappings = dict(class_id='class_id', latitude='lat', longitude='lon',
+                    start_date=dict(value='2018-09-01'), end_date=dict(value='2019-08-31'))
+    entries = io.StringIO('lon,lat,class_id\n-47.5,-15.75,1\n-45.25,-10.0,2\n-47.5,-15.75,1\n-47.5,-15.75,2\n')
+
+    storager = MemoryStorager(columnar=True)
+    driver = make_driver(CSV, entries, mappings, storager=storager, chunk_size=2, dedupe=Deduplicator())
+
+    driver.load_and_store('dataset_table')
+
+    assert [len(batch) for batch in storager.batches] == [2, 1]
+    assert driver.dedupe.duplicates == 1
+    # The driver releases the hashes once the samples are stored
+    assert len(driver.dedupe) == 0
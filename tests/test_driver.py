@@ -0,0 +1,646 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils drivers."""
+import asyncio
+import contextvars
+import copy
+import io
+import os
+import pickle
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+import shapely
+from conftest import AsyncMemoryStorager, MemoryStorager
+
+from sample_db_utils.core.classes import ClassCache
+from sample_db_utils.core.driver import (CSV, FlatGeobuf, GeoPackage,
+                                         GeoParquet, Shapefile)
+from sample_db_utils.drivers.inSitu import InSitu
+
+
+def _make_csv_driver(**kwargs):
+    mappings = dict(
+        class_id='class_id',
+        latitude='lat',
+        longitude='lon',
+        start_date=dict(value='2018-09-01'),
+        end_date=dict(value='2019-08-31'),
+        collection_date=dict(value='2019-01-15'),
+    )
+    mappings.update(kwargs)
+
+    return CSV(entries=None, mappings=mappings)
+
+
+def test_csv_build_data_set_points():
+    driver = _make_csv_driver()
+    csv = pd.DataFrame(dict(lon=[-47.5, -45.25], lat=[-15.75, -10.0], class_id=[1, 2]))
+
+    data_set = driver.build_data_set(csv)
+
+    locations = shapely.from_wkb(data_set['location'].to_numpy())
+
+    assert [point.wkt for point in locations] == ['POINT (-47.5 -15.75)', 'POINT (-45.25 -10)']
+    assert list(shapely.get_srid(locations)) == [4326, 4326]
+    assert list(data_set['class_id']) == [1, 2]
+    assert 'geometry' not in data_set.columns
+
+
+def test_csv_constants():
+    driver = _make_csv_driver()
+    csv = pd.DataFrame(dict(lon=[-47.5], lat=[-15.75], class_id=[1]))
+
+    data_set = driver.build_data_set(csv)
+
+    assert 'start_date' not in data_set.columns
+    assert driver.get_constants() == dict(
+        user_id=None, start_date='2018-09-01', end_date='2019-08-31', collection_date='2019-01-15'
+    )
+
+
+def test_csv_load_and_store_chunks(monkeypatch):
+    monkeypatch.setattr(CSV, 'resolve_classes', lambda self, classes: classes.to_numpy())
+
+    storager = MemoryStorager(classification_system_id=None)
+    entries = io.StringIO('lon,lat,class_id\n-47.5,-15.75,1\n-45.25,-10.0,2\n-44.0,-9.5,1\n')
+    driver = CSV(entries=entries, mappings=_make_csv_driver().mappings, storager=storager, chunk_size=2)
+
+    driver.load_and_store('dataset_table')
+
+    assert [len(batch) for batch in storager.batches] == [2, 1]
+    assert storager.batches[1][0]['location'].srid == 4326
+    assert len(driver.get_data_sets()) == 0
+
+
+def test_csv_get_format():
+    assert CSV.get_format('samples.csv') == 'csv'
+    assert CSV.get_format('samples.json') == 'json'
+    assert CSV.get_format('samples.jsonl') == 'jsonl'
+
+
+def test_shapefile_build_data_frame():
+    mappings = dict(class_id='class_id', start_date=dict(value='2018-09-01'), end_date='end')
+    driver = Shapefile(entries=None, mappings=mappings, reader='arrow')
+    driver.crs = 4326
+
+    frame = pd.DataFrame(dict(class_id=[1, 2], end=['31/08/2019', '2019-08-31']))
+    geometries = shapely.to_wkb([shapely.Point(-47.5, -15.75), shapely.Point(-45.0, -10.0)])
+
+    data_set = driver.build_data_frame(frame, geometries)
+
+    assert list(data_set['class_id']) == [1, 2]
+    assert list(data_set['end_date']) == ['2019-08-31', '2019-08-31']
+    assert list(data_set['collection_date']) == [None, None]
+    assert 'start_date' not in data_set.columns
+
+
+def test_csv_build_data_set_wkt():
+    driver = CSV(entries=None, mappings=dict(geom='wkt', class_id='class_id',
+                                             start_date=dict(value='2018-09-01'),
+                                             end_date=dict(value='2019-08-31')))
+    csv = pd.DataFrame(dict(wkt=['POLYGON ((0 0, 1 0, 1 1, 0 0))'], class_id=[1]))
+
+    data_set = driver.build_data_set(csv)
+
+    location = shapely.from_wkb(data_set['location'].iloc[0])
+
+    assert location.geom_type == 'Polygon'
+    assert shapely.get_srid(location) == 4326
+
+
+def _write_csv_files(directory, count):
+    for i in range(count):
+        csv = pd.DataFrame(dict(lon=[-47.5 + i, -45.0], lat=[-15.75, -10.0 - i], class_id=[1, 2]))
+        csv.to_csv(directory / f'samples-{i:02d}.csv', index=False)
+
+
+def test_csv_load_data_sets_parallel(tmp_path, make_driver):
+    _write_csv_files(tmp_path, 4)
+
+    driver = make_driver(CSV, str(tmp_path), _make_csv_driver().mappings, workers=2)
+    files = driver.get_files()
+
+    driver.load_data_sets()
+
+    data_set = driver.get_data_sets().to_frame()
+    expected = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+
+    assert len(data_set) == 8
+    assert list(data_set['class_id']) == list(expected['class_id'])
+
+
+def test_csv_load_data_sets_parallel_invalid_class(tmp_path, make_driver):
+    _write_csv_files(tmp_path, 2)
+
+    driver = make_driver(CSV, str(tmp_path), _make_csv_driver().mappings, classes=[1], workers=2)
+    files = driver.get_files()
+
+    with pytest.raises(RuntimeError, match=f'Could not load {files[0]}: The classes: 2 does not exist'):
+        driver.load_data_sets()
+
+
+def test_driver_copy_keeps_state(tmp_path):
+    storager = MemoryStorager()
+    driver = CSV(entries=str(tmp_path), mappings=_make_csv_driver().mappings, storager=storager, workers=2)
+
+    # Only the payload of worker processes drops the storager and the entries
+    assert copy.copy(driver).storager is storager
+    assert pickle.loads(pickle.dumps(driver)).entries == str(tmp_path)
+    assert driver.get_worker_state()['storager'] is None
+
+
+def test_csv_build_data_set_date_columns():
+    driver = _make_csv_driver(start_date='start', collection_date='collected')
+    csv = pd.DataFrame(dict(lon=[-47.5, -45.0], lat=[-15.75, -10.0], class_id=[1, 2],
+                            start=['01/09/2018', '2018-09-02'], collected=['15/01/2019', None]))
+
+    data_set = driver.build_data_set(csv)
+
+    assert list(data_set['start_date']) == ['2018-09-01', '2018-09-02']
+    assert list(data_set['collection_date']) == ['2019-01-15', None]
+
+
+def test_shapefile_get_zip_files(tmp_path):
+    archive = tmp_path / 'samples.zip'
+
+    with zipfile.ZipFile(archive, 'w') as zip_object:
+        for name in ('samples.shp', 'samples.dbf', 'other/more.shp'):
+            zip_object.writestr(name, b'')
+
+    driver = Shapefile(entries=str(archive), mappings=dict(class_id='class_id'))
+
+    assert driver.get_files() == [
+        f'/vsizip/{archive}/samples.shp',
+        f'/vsizip/{archive}/other/more.shp',
+    ]
+    assert driver.temporary_folder is None
+
+
+def test_shapefile_extract_for_workers():
+    stream = io.BytesIO()
+
+    with zipfile.ZipFile(stream, 'w') as zip_object:
+        zip_object.writestr('samples.shp', b'')
+
+    driver = Shapefile(entries=stream, mappings=dict(class_id='class_id'), workers=2)
+
+    with driver:
+        files = driver.get_files()
+        folder = driver.temporary_folder.name
+
+        assert files == [os.path.join(folder, 'samples.shp')]
+        assert os.path.exists(files[0])
+
+    assert not os.path.exists(folder)
+
+
+def test_csv_load_and_store_pipeline(tmp_path, make_driver):
+    _write_csv_files(tmp_path, 3)
+
+    storager = MemoryStorager(columnar=True)
+    driver = make_driver(CSV, str(tmp_path), _make_csv_driver().mappings, storager=storager, chunk_size=1)
+
+    driver.load_and_store('dataset_table', pipeline=True, queue_size=1)
+
+    assert [len(batch) for batch in storager.batches] == [1] * 6
+    assert len(driver.get_data_sets()) == 0
+
+
+REQUEST = contextvars.ContextVar('request')
+
+
+def test_csv_load_and_store_pipeline_context(tmp_path):
+    _write_csv_files(tmp_path, 2)
+
+    seen = []
+
+    class ContextCSV(CSV):
+        def read_chunks(self, file):
+            seen.append(('read', REQUEST.get(None)))
+            yield from super(ContextCSV, self).read_chunks(file)
+
+        def transform_chunk(self, file, chunk):
+            seen.append(('transform', REQUEST.get(None)))
+            return super(ContextCSV, self).transform_chunk(file, chunk)
+
+    def loader(system_id):
+        seen.append(('classes', threading.current_thread().name, REQUEST.get(None)))
+        return [1, 2]
+
+    storager = MemoryStorager(columnar=True)
+
+    driver = ContextCSV(entries=str(tmp_path), mappings=_make_csv_driver().mappings,
+                        storager=storager, chunk_size=1)
+    driver.class_cache = ClassCache(loader=loader)
+
+    REQUEST.set('app')
+
+    try:
+        driver.load_and_store('dataset_table', pipeline=True, queue_size=1)
+    finally:
+        REQUEST.set(None)
+
+    # The classes are queried by the calling thread, the pipeline threads keep its context
+    assert seen[0] == ('classes', threading.current_thread().name, 'app')
+    assert {stage for stage, *_ in seen} == {'classes', 'read', 'transform'}
+    assert all(item[-1] == 'app' for item in seen)
+
+
+def test_csv_load_and_store_pipeline_error(tmp_path, make_driver):
+    _write_csv_files(tmp_path, 3)
+
+    storager = MemoryStorager(columnar=True)
+    driver = make_driver(CSV, str(tmp_path), _make_csv_driver().mappings, classes=[1], storager=storager,
+                         chunk_size=1)
+
+    with pytest.raises(RuntimeError, match='does not exist'):
+        driver.load_and_store('dataset_table', pipeline=True, queue_size=1)
+
+    assert len(storager.batches) == 1
+
+
+@pytest.mark.parametrize('storager_class', [MemoryStorager, AsyncMemoryStorager])
+def test_csv_aload_and_store(tmp_path, storager_class):
+    _write_csv_files(tmp_path, 2)
+
+    storager = storager_class(columnar=True)
+
+    queries = []
+
+    driver = CSV(entries=str(tmp_path), mappings=_make_csv_driver().mappings,
+                 storager=storager, chunk_size=1)
+    driver.class_cache = ClassCache(loader=lambda system_id: queries.append(system_id) or [1, 2])
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        asyncio.run(driver.aload_and_store('dataset_table', executor=executor))
+
+    assert [len(batch) for batch in storager.batches] == [1] * 4
+    assert queries == [1]
+
+    if storager_class is AsyncMemoryStorager:
+        # The storager runs its blocking work in the executor of driver
+        assert storager.executors == [executor] * 4
+
+
+def _write_geoparquet(path, **kwargs):
+    geopandas = pytest.importorskip('geopandas')
+    pytest.importorskip('pyarrow')
+
+    frame = geopandas.GeoDataFrame(
+        dict(class_id=[1, 2, 1, 2], end=['2019-08-31'] * 4, unused=range(4)),
+        geometry=[shapely.Point(-47.5, -15.75), shapely.Point(-45.0, -10.0),
+                  shapely.Point(10.0, 45.0), shapely.Point(12.0, 46.0)],
+        crs=4326
+    )
+    frame.to_parquet(path, write_covering_bbox=True, row_group_size=2, **kwargs)
+
+
+def test_geoparquet_load(tmp_path, make_driver):
+    _write_geoparquet(tmp_path / 'samples.parquet')
+
+    mappings = dict(class_id='class_id', start_date=dict(value='2018-09-01'), end_date='end')
+    driver = make_driver(GeoParquet, str(tmp_path), mappings, chunk_size=3)
+
+    data_set = driver.load_data_sets().get_data_sets().to_frame()
+
+    assert list(data_set['class_id']) == [1, 2, 1, 2]
+    assert list(data_set['end_date']) == ['2019-08-31'] * 4
+    assert shapely.from_wkb(data_set['location'].iloc[2]).wkt == 'POINT (10 45)'
+
+
+def test_geoparquet_bbox(tmp_path, monkeypatch, make_driver):
+    _write_geoparquet(tmp_path / 'samples.parquet')
+
+    read_row_groups = []
+    select_row_groups = GeoParquet.select_row_groups
+
+    def spy(*args):
+        row_groups = select_row_groups(*args)
+        read_row_groups.extend(row_groups)
+
+        return row_groups
+
+    monkeypatch.setattr(GeoParquet, 'select_row_groups', staticmethod(spy))
+
+    mappings = dict(class_id='class_id', start_date=dict(value='2018-09-01'), end_date='end')
+    driver = make_driver(GeoParquet, str(tmp_path / 'samples.parquet'), mappings, bbox=(-46.0, -11.0, -44.0, -9.0))
+
+    data_set = driver.load_data_sets().get_data_sets().to_frame()
+
+    assert read_row_groups == [0]
+    assert list(data_set['class_id']) == [2]
+
+
+def test_driver_get_mapped_columns():
+    driver = _make_csv_driver(start_date='start')
+
+    assert driver.get_mapped_columns() == ['lon', 'lat', 'class_id', 'start']
+
+
+def test_geopackage_get_files(tmp_path):
+    for name in ('samples.gpkg', 'samples.shp', 'other.gpkg'):
+        (tmp_path / name).write_bytes(b'')
+
+    driver = GeoPackage(entries=str(tmp_path), mappings=dict(class_id='class_id'))
+
+    assert sorted(os.path.basename(f) for f in driver.get_files()) == ['other.gpkg', 'samples.gpkg']
+
+
+def test_csv_validate(make_driver):
+    entries = io.StringIO('lon,lat,class_id,start\n'
+                          '-47.5,-15.75,1,01/09/2018\n'
+                          '-45.25,95.0,2,2018-09-31\n'
+                          '-44.0,-9.5,3,2018-09-02\n')
+    driver = make_driver(CSV, entries, _make_csv_driver(start_date='start').mappings, chunk_size=2)
+
+    report = driver.validate()
+
+    assert not report.valid
+    assert report.rows == 3
+    assert report.classes == {1, 2, 3}
+    assert report.missing_classes == [3]
+    assert report.invalid_dates == {'start_date': 1}
+    assert report.out_of_bounds == 1
+    assert [message for _, message in report.errors] == ['Invalid start_date: 2018-09-31']
+    assert len(driver.get_data_sets()) == 0
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'json', 'jsonl'])
+def test_csv_validate_then_load(file_format, make_driver):
+    csv = pd.DataFrame(dict(lon=[-47.5, -45.25], lat=[-15.75, -10.0], class_id=[1, 2], start=['2018-09-01'] * 2))
+
+    if file_format == 'csv':
+        entries = io.StringIO(csv.to_csv(index=False))
+    else:
+        entries = io.StringIO(csv.to_json(orient='records', lines=file_format == 'jsonl'))
+        entries.name = f'samples.{file_format}'
+
+    driver = make_driver(CSV, entries, _make_csv_driver(start_date='start').mappings, chunk_size=1)
+
+    assert driver.validate().valid
+    assert len(driver.load_data_sets().get_data_sets()) == 2
+
+
+def test_geoparquet_validate(tmp_path, make_driver):
+    _write_geoparquet(tmp_path / 'samples.parquet')
+
+    mappings = dict(class_id='class_id', start_date=dict(value='2018-09-01'), end_date='missing')
+    driver = make_driver(GeoParquet, str(tmp_path), mappings)
+
+    report = driver.validate()
+
+    assert report.files == 1
+    assert report.rows == 4
+    assert report.missing_classes == []
+    assert [message for _, message in report.errors] == ['Missing column missing']
+
+
+def test_csv_resolve_class_names():
+    entries = io.StringIO('lon,lat,label\n-47.5,-15.75,Forest\n-45.25,-10.0,Water\n-44.0,-9.5,Forest\n')
+    storager = MemoryStorager(columnar=True)
+
+    queries = []
+
+    driver = CSV(entries=entries, mappings=_make_csv_driver(class_id=None, class_name='label').mappings,
+                 storager=storager, chunk_size=2)
+    driver.class_cache = ClassCache(loader=lambda system_id: [],
+                                    names_loader=lambda system_id: queries.append(system_id) or dict(Forest=1, Water=2))
+
+    driver.load_and_store('dataset_table')
+
+    assert [list(batch.to_frame()['class_id']) for batch in storager.batches] == [[1, 2], [1]]
+    assert queries == [1]
+    assert driver.get_mapped_columns() == ['lon', 'lat', 'label']
+
+
+def test_csv_resolve_class_names_unknown():
+    driver = CSV(entries=None, mappings=_make_csv_driver(class_id=None, class_name='label').mappings,
+                 storager=MemoryStorager())
+    driver.class_cache = ClassCache(names_loader=lambda system_id: dict(Forest=1))
+
+    with pytest.raises(RuntimeError, match='Pasture, Water'):
+        driver.resolve_classes(['Forest', 'Pasture', 'Water', 'Pasture'])
+
+
+def test_csv_build_data_set_reproject():
+    pytest.importorskip('pyproj')
+
+    driver = _make_csv_driver(srid='32723')
+    csv = pd.DataFrame(dict(lon=[500000.0], lat=[8260000.0], class_id=[1]))
+
+    data_set = driver.build_data_set(csv)
+
+    location = shapely.from_wkb(data_set['location'].iloc[0])
+
+    assert shapely.get_srid(location) == 4326
+    assert location.x == pytest.approx(-45.0, abs=1e-6)
+    assert location.y == pytest.approx(-15.73, abs=1e-2)
+
+
+def test_csv_build_data_set_wkt_reproject():
+    pytest.importorskip('pyproj')
+
+    driver = CSV(entries=None, mappings=dict(geom='wkt', class_id='class_id', srid=32723,
+                                             start_date=dict(value='2018-09-01'),
+                                             end_date=dict(value='2019-08-31')))
+    csv = pd.DataFrame(dict(wkt=['POINT (500000 8260000)', 'POINT (500000 10000000)'], class_id=[1, 2]))
+
+    locations = shapely.from_wkb(driver.build_data_set(csv)['location'].to_numpy())
+
+    assert [round(point.x, 6) for point in locations] == [-45.0, -45.0]
+    assert locations[1].y == pytest.approx(0.0, abs=1e-6)
+
+
+def test_shapefile_transform_chunk_resolves_classes():
+    mappings = dict(class_name='label', start_date=dict(value='2018-09-01'), end_date=dict(value='2019-08-31'))
+    driver = Shapefile(entries=None, mappings=mappings, storager=MemoryStorager(), reader='arrow')
+    driver.class_cache = ClassCache(names_loader=lambda system_id: dict(Forest=1, Water=2))
+
+    geometries = shapely.to_wkb([shapely.Point(-47.5, -15.75), shapely.Point(-45.0, -10.0)])
+
+    data_set = driver.transform_chunk(None, (pd.DataFrame(dict(label=['Water', 'Forest'])), geometries, 4326))
+
+    assert list(data_set.to_frame()['class_id']) == [2, 1]
+
+    with pytest.raises(RuntimeError, match='Pasture'):
+        driver.transform_chunk(None, (pd.DataFrame(dict(label=['Pasture', 'Forest'])), geometries, 4326))
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2])
+def test_csv_read_pyarrow(tmp_path, chunk_size):
+    pytest.importorskip('pyarrow')
+
+    path = tmp_path / 'samples.csv'
+    path.write_text('id,lon,lat,class_id,start,unused\n'
+                    '1,-47.5,-15.75,1,01/09/2018,a\n'
+                    '2,-45.25,-10.0,2,2018-09-02,b\n'
+                    '3,-44.0,-9.5,1,2018-09-03,c\n')
+
+    driver = CSV(entries=str(path), mappings=_make_csv_driver(start_date='start').mappings,
+                 engine='pyarrow', chunk_size=chunk_size)
+
+    frames = list(driver.read(str(path)))
+
+    assert [len(frame) for frame in frames] == ([3] if chunk_size is None else [2, 1])
+
+    frame = pd.concat(frames, ignore_index=True)
+
+    assert list(frame.columns) == ['lon', 'lat', 'class_id', 'start']
+    assert list(frame['start']) == ['01/09/2018', '2018-09-02', '2018-09-03']
+    assert list(driver.build_data_set(frame)['start_date']) == ['2018-09-01', '2018-09-02', '2018-09-03']
+
+
+def test_csv_read_pyarrow_missing_column():
+    pytest.importorskip('pyarrow')
+
+    entries = io.StringIO('lon,class_id\n-47.5,1\n')
+    driver = CSV(entries=entries, mappings=_make_csv_driver().mappings, engine='pyarrow')
+
+    with pytest.raises(KeyError, match='Missing column lat'):
+        list(driver.read(entries))
+
+
+def test_geopackage_get_fingerprint(tmp_path):
+    first, second = tmp_path / 'first.gpkg', tmp_path / 'second.gpkg'
+    first.write_bytes(b'first')
+    second.write_bytes(b'second')
+
+    driver = GeoPackage(entries=str(tmp_path), mappings=dict(class_id='class_id'))
+
+    assert driver.get_fingerprint(str(first)) != driver.get_fingerprint(str(second))
+    assert driver.get_fingerprint(str(first)) == driver.get_fingerprint(str(first))
+
+
+def _write_ogr(path, format_name):
+    ogr = pytest.importorskip('osgeo.ogr')
+    osr = pytest.importorskip('osgeo.osr')
+
+    spatial_ref = osr.SpatialReference()
+    spatial_ref.ImportFromEPSG(4326)
+    spatial_ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    data_source = ogr.GetDriverByName(format_name).CreateDataSource(str(path))
+    layer = data_source.CreateLayer('samples', spatial_ref, ogr.wkbPoint)
+    layer.CreateField(ogr.FieldDefn('class_id', ogr.OFTInteger))
+    layer.CreateField(ogr.FieldDefn('end', ogr.OFTString))
+
+    for class_id, (x, y) in zip([1, 2, 1], [(-47.5, -15.75), (-45.0, -10.0), (10.0, 45.0)]):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField('class_id', class_id)
+        feature.SetField('end', '2019-08-31')
+        feature.SetGeometry(ogr.CreateGeometryFromWkt(f'POINT ({x} {y})'))
+        layer.CreateFeature(feature)
+
+    # Flush the datasource
+    data_source = None
+
+
+def _load_ogr(make_driver, driver_class, entries, **kwargs):
+    mappings = dict(class_id='class_id', start_date=dict(value='2018-09-01'), end_date='end')
+
+    return make_driver(driver_class, entries, mappings, **kwargs).load_data_sets().get_data_sets().to_frame()
+
+
+def _get_arrow_readers():
+    ogr = pytest.importorskip('osgeo.ogr')
+
+    if not hasattr(ogr.Layer, 'GetArrowStreamAsNumPy'):
+        return ['ogr']
+
+    return ['ogr', 'arrow']
+
+
+@pytest.mark.parametrize('driver_class, format_name, extension', [
+    (GeoPackage, 'GPKG', '.gpkg'),
+    (FlatGeobuf, 'FlatGeobuf', '.fgb'),
+])
+def test_ogr_formats_load(tmp_path, make_driver, driver_class, format_name, extension):
+    path = tmp_path / f'samples{extension}'
+    _write_ogr(path, format_name)
+
+    for reader in _get_arrow_readers():
+        data_set = _load_ogr(make_driver, driver_class, str(path), reader=reader)
+
+        assert list(data_set['class_id']) == [1, 2, 1]
+        assert [str(value)[:10] for value in data_set['end_date']] == ['2019-08-31'] * 3
+        assert shapely.from_wkb(data_set['location'].iloc[2]).wkt == 'POINT (10 45)'
+
+
+def _write_zipped_shapefile(directory, archive):
+    _write_ogr(directory / 'samples.shp', 'ESRI Shapefile')
+
+    with zipfile.ZipFile(archive, 'w') as zip_object:
+        for member in sorted(directory.iterdir()):
+            zip_object.write(member, member.name)
+
+
+def test_shapefile_load_vsizip(tmp_path, make_driver):
+    (tmp_path / 'shapefile').mkdir()
+    archive = tmp_path / 'samples.zip'
+    _write_zipped_shapefile(tmp_path / 'shapefile', archive)
+
+    for reader in _get_arrow_readers():
+        data_set = _load_ogr(make_driver, Shapefile, str(archive), reader=reader)
+
+        assert list(data_set['class_id']) == [1, 2, 1]
+        assert shapely.from_wkb(data_set['location'].iloc[0]).wkt == 'POINT (-47.5 -15.75)'
+
+    # A stream is read through an in-memory archive, which is released after the load
+    driver = Shapefile(entries=io.BytesIO(archive.read_bytes()), mappings=dict(class_id='class_id'))
+
+    with driver:
+        files = driver.get_files()
+
+        assert len(files) == 1 and files[0].startswith('/vsizip//vsimem/')
+        assert driver.get_fingerprint(files[0]) == driver.get_fingerprint(files[0])
+
+    assert driver._memory_files == []
+
+
+def test_geopackage_get_fingerprint_vsizip(tmp_path):
+    first, second = tmp_path / 'first.gpkg', tmp_path / 'second.gpkg'
+    _write_ogr(first, 'GPKG')
+    _write_ogr(second, 'GPKG')
+
+    with zipfile.ZipFile(tmp_path / 'samples.zip', 'w') as zip_object:
+        zip_object.write(first, 'first.gpkg')
+        zip_object.writestr('second.gpkg', second.read_bytes() + b'changed')
+
+    driver = GeoPackage(entries=str(tmp_path / 'samples.zip'), mappings=dict(class_id='class_id'))
+    files = driver.get_files()
+
+    assert [os.path.basename(f) for f in files] == ['first.gpkg', 'second.gpkg']
+    assert driver.get_fingerprint(files[0]) != driver.get_fingerprint(files[1])
+
+
+def test_insitu_generates_files_for_every_entry_point(tmp_path, monkeypatch):
+    generated = []
+
+    def generate_data_sets(entries):
+        generated.append(entries)
+        pd.DataFrame(dict(geometry=['POINT (-47.5 -15.75)'], class_id=[1], start_date=['2018-09-01'],
+                          end_date=['2019-08-31'], collection_date=['2019-01-15'])).to_csv(
+            os.path.join(entries, 'samples.csv'), index=False)
+
+    monkeypatch.setattr(InSitu, 'generate_data_sets', staticmethod(generate_data_sets))
+
+    storager = MemoryStorager(columnar=True)
+
+    driver = InSitu(str(tmp_path), storager)
+    driver.class_cache = ClassCache(loader=lambda system_id: [1])
+
+    assert driver.validate().rows == 1
+
+    driver.load_and_store('dataset_table')
+
+    assert [len(batch) for batch in storager.batches] == [1]
+    assert generated == [str(tmp_path)] * 2
@@ -10,7 +10,9 @@ import json
 
 import pytest
 
+from sample_db_utils.core import registry
 from sample_db_utils.core.driver import Driver
+from sample_db_utils.core.registry import DriverRegistry
 from sample_db_utils.factory import factory
 
 
@@ -48,3 +50,31 @@ def test_drive_create():
     driver: Driver = driver_klass(entries=None, mappings=mappings)
 
     assert driver.__class__.__name__ == "Shapefile"
+
+
+def test_driver_registry(monkeypatch):
+    """Test the drivers are imported on first use, including entry points."""
+    class EntryPoint:
+        name = 'External'
+
+        def load(self):
+            return Driver
+
+    monkeypatch.setattr(registry, 'iter_entry_points', lambda group: [EntryPoint()])
+
+    drivers = DriverRegistry({'CSV': 'sample_db_utils.core.driver:CSV'}, group='sample_db_utils.drivers')
+
+    assert sorted(drivers.names()) == ['CSV', 'External']
+    assert drivers.get('CSV').__name__ == 'CSV'
+    assert drivers.get('External') is Driver
+
+    with pytest.raises(KeyError):
+        drivers.get('Missing')
+
+
+def test_lazy_exports():
+    """Test the package exports the drivers."""
+    import sample_db_utils
+
+    assert sample_db_utils.CSV.__name__ == 'CSV'
+    assert 'Shapefile' in dir(sample_db_utils)
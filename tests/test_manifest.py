@@ -0,0 +1,92 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils checkpoint manifest."""
+import pandas as pd
+import pytest
+from conftest import MemoryStorager
+
+from sample_db_utils.core.driver import CSV
+from sample_db_utils.core.manifest import LOADING, STORED, Manifest, hash_file
+
+MAPPINGS = dict(class_id='class_id', latitude='lat', longitude='lon',
+                start_date=dict(value='2018-09-01'), end_date=dict(value='2019-08-31'))
+
+
+def _write_files(directory, count):
+    for i in range(count):
+        csv = pd.DataFrame(dict(lon=[-47.5 + i], lat=[-15.75], class_id=[1]))
+        csv.to_csv(directory / f'samples-{i:02d}.csv', index=False)
+
+
+def test_manifest_resume(tmp_path, make_driver):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    _write_files(data_dir, 4)
+
+    manifest = Manifest(tmp_path / 'manifest.sqlite')
+
+    storager = MemoryStorager(columnar=True, fail_after=2)
+
+    with pytest.raises(RuntimeError):
+        make_driver(CSV, str(data_dir), MAPPINGS, storager=storager, manifest=manifest).load_and_store('dataset_table')
+
+    storager = MemoryStorager(columnar=True)
+    make_driver(CSV, str(data_dir), MAPPINGS, storager=storager, manifest=manifest).load_and_store('dataset_table')
+
+    assert len(storager.batches) == 2
+
+    # Changed files are loaded again
+    pd.DataFrame(dict(lon=[-40.0], lat=[-10.0], class_id=[2])).to_csv(data_dir / 'samples-00.csv', index=False)
+
+    storager = MemoryStorager(columnar=True)
+    make_driver(CSV, str(data_dir), MAPPINGS, storager=storager, manifest=manifest).load_and_store('dataset_table')
+
+    assert len(storager.batches) == 1
+    assert manifest.get(str(data_dir / 'samples-00.csv')) == (hash_file(data_dir / 'samples-00.csv'), STORED, 1)
+
+
+def test_manifest_resume_partial_file(tmp_path, make_driver):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    pd.DataFrame(dict(lon=[-47.5, -47.0, -46.5, -46.0], lat=[-15.75] * 4, class_id=[1, 2, 1, 2])).to_csv(
+        data_dir / 'samples.csv', index=False)
+
+    manifest = Manifest(tmp_path / 'manifest.sqlite')
+
+    storager = MemoryStorager(columnar=True, fail_after=1)
+
+    driver = make_driver(CSV, str(data_dir), MAPPINGS, storager=storager, manifest=manifest, chunk_size=2)
+
+    with pytest.raises(RuntimeError):
+        driver.load_and_store('dataset_table')
+
+    assert manifest.get(str(data_dir / 'samples.csv'))[1:] == (LOADING, 2)
+
+    # The first chunk stored by the failed run is skipped
+    resumed = MemoryStorager(columnar=True)
+    driver = make_driver(CSV, str(data_dir), MAPPINGS, storager=resumed, manifest=manifest, chunk_size=3)
+    driver.load_and_store('dataset_table')
+
+    stored = [batch.to_frame() for batch in storager.batches + resumed.batches]
+
+    assert sum(len(frame) for frame in stored) == 4
+    assert list(pd.concat(stored)['class_id']) == [1, 2, 1, 2]
+    assert manifest.get(str(data_dir / 'samples.csv'))[1:] == (STORED, 4)
+
+
+def test_manifest_resume_partial_file_load_data_sets(tmp_path, make_driver):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    _write_files(data_dir, 1)
+
+    manifest = Manifest(tmp_path / 'manifest.sqlite')
+    manifest.mark(str(data_dir / 'samples-00.csv'), hash_file(data_dir / 'samples-00.csv'), LOADING, rows=1)
+
+    driver = make_driver(CSV, str(data_dir), MAPPINGS, manifest=manifest).load_data_sets()
+
+    assert len(driver.get_data_sets()) == 0
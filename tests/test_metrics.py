@@ -0,0 +1,100 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils metrics."""
+import io
+import json
+
+import numpy
+import pytest
+
+from sample_db_utils.core.driver import CSV
+from sample_db_utils.core.metrics import JSONLinesExporter, Metrics, get_memory
+
+
+def test_metrics_stage():
+    reported = []
+    metrics = Metrics(reported.append)
+
+    with metrics.stage('transform', 'samples.csv') as stage:
+        stage.rows = 10
+
+    assert [(m.stage, m.file, m.rows) for m in reported] == [('transform', 'samples.csv', 10)]
+    assert reported[0].wall_time >= 0
+
+
+def test_json_lines_exporter():
+    output = io.StringIO()
+    metrics = Metrics(JSONLinesExporter(output))
+
+    list(metrics.timed_iter('read', [[1, 2], [3]]))
+
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert [line['rows'] for line in lines] == [2, 1]
+    assert set(lines[0]) == {'stage', 'file', 'started', 'wall_time', 'rows', 'bytes_read', 'peak_memory'}
+
+
+def test_csv_load_and_store_metrics(make_driver):
+    reported = []
+    mappings = dict(class_id='class_id', latitude='lat', longitude='lon',
+                    start_date=dict(value='2018-09-01'), end_date=dict(value='2019-08-31'))
+    entries = io.StringIO('lon,lat,class_id\n-47.5,-15.75,1\n-45.25,-10.0,2\n-44.0,-9.5,1\n')
+
+    driver = make_driver(CSV, entries, mappings, chunk_size=2, metrics=Metrics(reported.append))
+
+    driver.load_and_store('dataset_table')
+
+    stages = [(m.stage, m.rows) for m in reported]
+
+    assert stages == [
+        ('get_files', 1),
+        ('read', 2), ('validate_classes', 2), ('transform', 2), ('store', 2),
+        ('read', 1), ('validate_classes', 1), ('transform', 1), ('store', 1),
+    ]
+
+
+def test_metrics_stage_peak_memory():
+    if get_memory() is None:
+        pytest.skip('The resident memory is only available on Linux')
+
+    reported = []
+    metrics = Metrics(reported.append)
+
+    with metrics.stage('large'):
+        values = numpy.ones(1 << 23)
+        del values
+
+    with metrics.stage('small'):
+        pass
+
+    large, small = reported
+
+    # The memory released by the first stage is not reported by the next one
+    assert large.peak_memory - small.peak_memory >= 32 << 20
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'pyarrow'])
+def test_csv_load_and_store_bytes_read(tmp_path, make_driver, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+
+    path = tmp_path / 'samples.csv'
+    path.write_text('lon,lat,class_id\n' + '-47.5,-15.75,1\n' * 1000)
+
+    reported = []
+    mappings = dict(class_id='class_id', latitude='lat', longitude='lon',
+                    start_date=dict(value='2018-09-01'), end_date=dict(value='2019-08-31'))
+
+    driver = make_driver(CSV, str(path), mappings, engine=engine, chunk_size=100, metrics=Metrics(reported.append))
+
+    driver.load_and_store('dataset_table')
+
+    read = [m.bytes_read for m in reported if m.stage == 'read']
+
+    assert len(read) == 10
+    assert sum(read) == path.stat().st_size
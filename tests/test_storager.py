@@ -0,0 +1,322 @@
+#
+# This file is part of Sample Database Utils.
+# Copyright (C) 2020-2021 INPE.
+#
+# Sample Database Utils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+#
+"""Test for sample-db-utils storagers.
+
+The tests which write into database run only when the environment variable
+``SAMPLE_DB_UTILS_TEST_DATABASE_URI`` points to a throwaway PostGIS database.
+"""
+import os
+from collections import namedtuple
+
+import pandas as pd
+import pytest
+import shapely
+
+from sample_db_utils.core.dataset import DataSet
+from sample_db_utils.core.storager import CopyStorager
+from sample_db_utils.core.utils import to_ewkb
+
+DATABASE_URI = os.environ.get('SAMPLE_DB_UTILS_TEST_DATABASE_URI')
+
+requires_database = pytest.mark.skipif(not DATABASE_URI, reason='SAMPLE_DB_UTILS_TEST_DATABASE_URI is not set')
+
+
+def _make_data_set(size):
+    points = shapely.points(range(size), range(size))
+
+    data_set = DataSet()
+    data_set.append(pd.DataFrame(dict(location=to_ewkb(points), class_id=[1] * size, extra=[0] * size)),
+                    user_id=None, start_date='2018-09-01', end_date='2019-08-31')
+
+    return data_set
+
+
+def test_copy_storager_build_buffer():
+    data_set = _make_data_set(2)
+    table, columns = CopyStorager.get_table('sampledb.dataset_table', data_set.columns)
+
+    buffer = CopyStorager.build_buffer(next(data_set.iter_frames()), columns)
+    rows = buffer.getvalue().splitlines()
+
+    assert table == '"sampledb"."dataset_table"'
+    assert columns == ['location', 'class_id', 'user_id', 'start_date', 'end_date']
+    assert rows[0] == '0101000020e610000000000000000000000000000000000000,1,,2018-09-01,2019-08-31'
+    assert len(rows) == 2
+
+
+Xid = namedtuple('Xid', ('format_id', 'gtrid', 'bqual'))
+
+
+class FakeCursor:
+    """DB-API cursor which runs the statements in its `FakeConnection`."""
+
+    def __init__(self, connection):
+        self.execute = connection.execute
+        self.copy_expert = connection.copy_expert
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """DB-API connection which records the statements and the ``COPY`` of each batch.
+
+    The operations listed in `fail`, such ``copy`` or ``commit``, raise an error.
+    """
+
+    def __init__(self, engine, fail=()):
+        self.engine = engine
+        self.fail = set(fail)
+        self.rows = []
+        self.statements = []
+        self.state = 'open'
+        self.current_xid = None
+
+    def _check(self, operation):
+        if operation in self.fail:
+            raise RuntimeError(f'Could not {operation}')
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def execute(self, sql):
+        self._check(sql.split()[0].lower())
+        self.statements.append(sql)
+
+    def copy_expert(self, sql, buffer):
+        self._check('copy')
+
+        self.statements.append(sql)
+        self.rows.extend(buffer.getvalue().splitlines())
+
+    def commit(self):
+        self._check('commit')
+        self.state = 'committed'
+
+    def rollback(self):
+        self.state = 'rolled back'
+
+    def xid(self, format_id, gtrid, bqual):
+        return Xid(format_id, gtrid, bqual)
+
+    def tpc_begin(self, xid):
+        self.current_xid = xid
+
+    def tpc_prepare(self):
+        self._check('prepare')
+        self.engine.prepared.append(self.current_xid)
+        self.state = 'prepared'
+
+    def tpc_commit(self, xid=None):
+        if xid is None:
+            self._check('tpc_commit')
+            xid = self.current_xid
+            self.state = 'committed'
+
+        self.engine.prepared.remove(xid)
+        self.engine.committed.append(xid)
+
+    def tpc_rollback(self, xid=None):
+        if xid is None:
+            xid = self.current_xid
+            self.state = 'rolled back'
+
+        if xid in self.engine.prepared:
+            self.engine.prepared.remove(xid)
+
+    def tpc_recover(self):
+        self._check('recover')
+
+        return list(self.engine.prepared)
+
+    def close(self):
+        self.engine.checked_out -= 1
+
+
+class FakeEngine:
+    """Engine which hands out `FakeConnection`, failing the operations given by connection index.
+
+    As a pool of `pool_size` connections, it fails when more connections are checked out at once.
+    """
+
+    def __init__(self, fail=None, pool_size=None):
+        self.connections = []
+        self.fail = fail or dict()
+        self.pool_size = pool_size
+        self.checked_out = 0
+        self.prepared = []
+        self.committed = []
+
+    def raw_connection(self):
+        if self.pool_size is not None and self.checked_out == self.pool_size:
+            raise TimeoutError('QueuePool limit reached')
+
+        connection = FakeConnection(self, fail=self.fail.get(len(self.connections), ()))
+        self.connections.append(connection)
+        self.checked_out += 1
+
+        return connection
+
+
+def test_copy_storager_workers():
+    # The pool has room for the worker connections only
+    engine = FakeEngine(pool_size=3)
+    storager = CopyStorager(engine, batch_size=2, workers=3)
+
+    storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    workers = engine.connections
+
+    assert len(workers) == 3 and engine.checked_out == 0
+    assert workers[0].statements[0].startswith('CREATE UNLOGGED TABLE "sample_db_utils_staging_')
+    assert [len(connection.rows) for connection in workers] == [4, 4, 2]
+    assert all('COPY "sample_db_utils_staging_' in connection.statements[-1] for connection in workers[1:])
+    assert 'COPY "sample_db_utils_staging_' in workers[0].statements[1]
+    assert workers[0].statements[-2].startswith('INSERT INTO "test_copy_storager"')
+    assert workers[0].statements[-1].startswith('DROP TABLE "sample_db_utils_staging_')
+    assert [connection.state for connection in workers] == ['committed'] * 3
+
+
+def test_copy_storager_workers_rollback():
+    engine = FakeEngine(fail={0: ['copy']}, pool_size=3)
+    storager = CopyStorager(engine, batch_size=2, workers=3)
+
+    with pytest.raises(RuntimeError, match='Could not copy'):
+        storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    workers = engine.connections[:3]
+
+    assert [connection.state for connection in workers] == ['rolled back'] * 3
+    assert not any(statement.startswith('INSERT') for statement in workers[0].statements)
+    assert engine.connections[-1].statements[0].startswith('DROP TABLE IF EXISTS "sample_db_utils_staging_')
+
+
+@pytest.mark.parametrize('fail', [{1: ['commit']}, {0: ['insert']}])
+def test_copy_storager_workers_commit_failure(fail):
+    engine = FakeEngine(fail=fail, pool_size=3)
+    storager = CopyStorager(engine, batch_size=2, workers=3)
+
+    with pytest.raises(RuntimeError, match='Could not (commit|insert)'):
+        storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    # The staged samples were never moved into the dataset table
+    assert engine.connections[0].state == 'rolled back'
+    assert not any(statement.startswith('INSERT') for statement in engine.connections[0].statements)
+    assert engine.connections[-1].statements[0].startswith('DROP TABLE IF EXISTS "sample_db_utils_staging_')
+    assert engine.checked_out == 0
+
+
+def test_copy_storager_two_phase():
+    engine = FakeEngine()
+    storager = CopyStorager(engine, batch_size=2, workers=3, two_phase=True)
+
+    storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    assert len(engine.connections) == 3
+    assert all('COPY "test_copy_storager"' in connection.statements[0] for connection in engine.connections)
+    assert [connection.state for connection in engine.connections] == ['committed'] * 3
+    assert len(engine.committed) == 3 and engine.prepared == []
+    assert len({xid.gtrid for xid in engine.committed}) == 1
+
+
+def test_copy_storager_two_phase_prepare_failure():
+    engine = FakeEngine(fail={1: ['prepare']})
+    storager = CopyStorager(engine, batch_size=2, workers=3, two_phase=True)
+
+    with pytest.raises(RuntimeError, match='Could not prepare'):
+        storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    assert [connection.state for connection in engine.connections] == ['rolled back'] * 3
+    assert engine.prepared == [] and engine.committed == []
+
+
+def test_copy_storager_two_phase_commit_failure():
+    engine = FakeEngine(fail={1: ['tpc_commit']})
+    storager = CopyStorager(engine, batch_size=2, workers=3, two_phase=True)
+
+    storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    # The transaction left prepared is committed through a new connection
+    assert len(engine.connections) == 4
+    assert engine.connections[1].state == 'prepared'
+    assert len(engine.committed) == 3 and engine.prepared == []
+
+
+def test_copy_storager_two_phase_recovery_failure():
+    engine = FakeEngine(fail={1: ['tpc_commit'], 3: ['recover']})
+    storager = CopyStorager(engine, batch_size=2, workers=3, two_phase=True)
+
+    with pytest.raises(RuntimeError, match='could not be resolved'):
+        storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    assert len(engine.prepared) == 1
+
+
+@pytest.fixture
+def engine():
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+
+    engine = sqlalchemy.create_engine(DATABASE_URI)
+
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            'CREATE TABLE test_copy_storager ('
+            'id SERIAL PRIMARY KEY, class_id INTEGER, user_id INTEGER, start_date DATE, end_date DATE, '
+            'collection_date DATE, location geometry(Geometry, 4326))'
+        ))
+
+    yield engine
+
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text('DROP TABLE test_copy_storager'))
+
+
+def _count(engine):
+    import sqlalchemy
+
+    with engine.connect() as connection:
+        return connection.execute(sqlalchemy.text('SELECT COUNT(*) FROM test_copy_storager')).scalar()
+
+
+@requires_database
+def test_copy_storager_store(engine):
+    storager = CopyStorager(engine, batch_size=3)
+
+    storager.store_data(_make_data_set(10), 'test_copy_storager')
+
+    assert _count(engine) == 10
+
+
+@requires_database
+def test_copy_storager_rollback(engine):
+    storager = CopyStorager(engine)
+
+    with pytest.raises(RuntimeError):
+        with storager:
+            storager.store_data(_make_data_set(10), 'test_copy_storager')
+            raise RuntimeError('Failure while loading')
+
+    assert _count(engine) == 0
+
+
+@requires_database
+@pytest.mark.parametrize('two_phase', [False, True])
+def test_copy_storager_store_workers(engine, two_phase):
+    storager = CopyStorager(engine, batch_size=3, workers=4, two_phase=two_phase)
+
+    try:
+        with storager:
+            storager.store_data(_make_data_set(10), 'test_copy_storager')
+            storager.store_data(_make_data_set(5), 'test_copy_storager')
+    except Exception as e:
+        if two_phase and 'prepared transactions are disabled' in str(e):
+            pytest.skip('max_prepared_transactions is zero')
+
+        raise
+
+    assert _count(engine) == 15
@@ -9,9 +9,14 @@
 import datetime
 import json
 
+import numpy
 import pytest
+import shapely
 
-from sample_db_utils.core.utils import get_date_from_str, validate_mappings
+from sample_db_utils.core.utils import (LRUCache, get_date_from_str,
+                                        parse_dates, reproject_coordinates,
+                                        validate_mappings, wkb_to_ewkb)
+from sample_db_utils.core.validation import count_out_of_bounds
 
 
 def test_get_date_from_str():
@@ -22,6 +27,26 @@ def test_get_date_from_str():
     assert isinstance(date, str)
 
 
+def test_parse_dates():
+    dates = parse_dates(['04/02/2014', '2014-02-05', None, '04/02/2014', 'unknown'])
+
+    assert list(dates) == ['2014-02-04', '2014-02-05', None, '2014-02-04', 'unknown']
+
+
+@pytest.mark.parametrize('errors', ['ignore', 'coerce', 'raise'])
+def test_parse_dates_out_of_nanosecond_range(errors):
+    # 9999-12-31 is the usual end date of samples without end
+    dates = parse_dates(['9999-12-31', '31/12/9999', '1500-01-01'], errors=errors)
+
+    assert list(dates) == ['9999-12-31', '9999-12-31', '1500-01-01']
+    assert get_date_from_str('31/12/9999') == '9999-12-31'
+
+
+@pytest.mark.xfail(raises=ValueError)
+def test_parse_dates_fail():
+    parse_dates(['2014-02-31'], errors='raise')
+
+
 def test_validate_mappings():
     mappings_str = '{"class_id":"class_id", "start_date":{"value":"1985-01-01"},"end_date":{"value":"1985-12-31"}}'
     validate_mappings(json.loads(mappings_str))
@@ -31,3 +56,51 @@ def test_validate_mappings():
 def test_validate_mappings_fail():
     mappings_str = '{"class_id":"class_id", "start_date":{"value":"1985-01-01"},"end_date":{"value":"1985-12-31"}}'
     validate_mappings(json.loads(mappings_str))
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('a', lambda: -1) == 1
+    assert cache.get('c', lambda: 3) == 3
+    # "b" is the least recently used
+    assert cache.get('b', lambda: -2) == -2
+    assert len(cache) == 2
+
+
+def test_reproject_coordinates():
+    x, y = reproject_coordinates(numpy.array([500000.0]), numpy.array([10000000.0]), 32723, 4326)
+
+    assert numpy.allclose(x, [-45.0])
+    assert numpy.allclose(y, [0.0])
+
+
+@pytest.mark.parametrize('byte_order', ['little', 'big'])
+def test_wkb_to_ewkb(byte_order):
+    point = shapely.Point(-47.5, -15.75)
+    wkb = shapely.to_wkb(point, byte_order=0 if byte_order == 'big' else 1)
+
+    ewkb = wkb_to_ewkb(wkb, srid=4326)
+
+    assert ewkb == shapely.to_wkb(shapely.set_srid(point, 4326), include_srid=True,
+                                  byte_order=0 if byte_order == 'big' else 1)
+
+
+@pytest.mark.parametrize('wkt', ['POINT M (-47.5 -15.75 1)', 'POINT ZM (-47.5 -15.75 2 1)',
+                                 'POLYGON M ((0 0 1, 1 0 1, 1 1 1, 0 0 1))'])
+def test_wkb_to_ewkb_measured(wkt):
+    geometry = shapely.from_wkt(wkt)
+    # The ISO codes written by OGR for measured geometries, such 2001 for POINT M
+    wkb = shapely.to_wkb(geometry, flavor='iso')
+
+    ewkb = wkb_to_ewkb(wkb, srid=4326)
+
+    assert shapely.get_srid(shapely.from_wkb(ewkb)) == 4326
+    assert shapely.from_wkb(ewkb).equals_exact(geometry, tolerance=0)
+    assert ewkb == shapely.to_wkb(shapely.set_srid(geometry, 4326), include_srid=True)
+
+
+def test_count_out_of_bounds():
+    assert count_out_of_bounds([-47.5, 181.0, 0.0], [-15.75, 0.0, float('nan')]) == 2